@@ -0,0 +1,141 @@
+import os
+import numpy as np
+import torch
+
+import data_store
+import metrics
+import model_logic
+
+# Multi-ticker prediction.
+# Bars for every ticker come from one bulk download. Tickers whose models share
+# an architecture are grouped, their weights are stacked along a leading
+# "model" dimension and the whole group runs through the LSTM in one batched
+# pass (bmm over the model dimension), instead of one forward per ticker.
+# Stacking is off by default: the stacked weights no longer fit in cache and are
+# re-read every time step, while a single model's fused nn.LSTM forward is cheap,
+# so on one torch thread the stacked pass was slower at every group size measured
+# (0.6x at 10 models, 0.9x at 32 and 50, 0.8x at 100; see
+# benchmarks/bench_batch_inference.py). Without it every group runs one (possibly
+# exported) model at a time. Set STOCKVISION_STACK_MIN_MODELS to a group size
+# where the benchmark shows a win on the serving hardware to enable it.
+
+MAX_BATCH_TICKERS = int(os.environ.get("STOCKVISION_MAX_BATCH_TICKERS", "50"))
+STACK_MIN_MODELS = int(os.environ.get("STOCKVISION_STACK_MIN_MODELS", "0"))  # 0: never stack
+FORECAST_DAYS = 3
+
+
+def architecture_key(meta):
+    return (tuple(meta["feature_cols"]), meta.get("seq_len", model_logic.SEQ_LEN),
+            meta.get("hidden_dim", model_logic.HIDDEN_DIM), meta.get("num_layers", model_logic.NUM_LAYERS),
+            meta.get("output_dim", 1))
+
+def stack_models(models):
+    """{param name: tensor (n_models, ...)} for a list of same-architecture StockLSTMs."""
+    states = [m.state_dict() for m in models]
+    return {name: torch.stack([state[name] for state in states]) for name in states[0]}
+
+def stacked_forward(stacked, x, num_layers):
+    """
+    StockLSTM.forward (eval mode) for M models at once.
+    x: (M, B, seq_len, n_features) -> (M, B, output_dim). Gate order matches nn.LSTM (i, f, g, o).
+    """
+    M, B, T, _ = x.shape
+    layer_input = x
+    for layer in range(num_layers):
+        w_ih = stacked[f"lstm.weight_ih_l{layer}"].transpose(1, 2)  # (M, in, 4H)
+        w_hh = stacked[f"lstm.weight_hh_l{layer}"].transpose(1, 2)  # (M, H, 4H)
+        bias = (stacked[f"lstm.bias_ih_l{layer}"] + stacked[f"lstm.bias_hh_l{layer}"]).unsqueeze(1)
+        hidden = w_hh.shape[1]
+
+        # Input projections for every time step in one bmm
+        x_proj = torch.bmm(layer_input.reshape(M, B * T, -1), w_ih).reshape(M, B, T, 4 * hidden)
+        h = x.new_zeros(M, B, hidden)
+        c = x.new_zeros(M, B, hidden)
+        outputs = []
+        for t in range(T):
+            gates = torch.baddbmm(x_proj[:, :, t] + bias, h, w_hh)
+            i, f, g, o = gates.chunk(4, dim=2)
+            c = torch.sigmoid(f) * c + torch.sigmoid(i) * torch.tanh(g)
+            h = torch.sigmoid(o) * torch.tanh(c)
+            if layer < num_layers - 1:
+                outputs.append(h)
+        if layer < num_layers - 1:
+            layer_input = torch.stack(outputs, dim=2)
+
+    # Dropout is the identity in eval mode; fc on the last hidden state
+    return torch.baddbmm(stacked["fc.bias"].unsqueeze(1), h, stacked["fc.weight"].transpose(1, 2))
+
+
+def _prepare(ticker, symbol, bars):
+    """Scaled last window and model entry for one ticker, or an error string."""
+    if bars is None or bars.empty:
+        return None, f"No data found for {ticker}. Try adding .NS for Indian stocks."
+    entry = model_logic.registry.get(symbol)
+    if entry is None or entry.meta is None or entry.scaler is None:
+        return None, "No trained model yet"
+    stock_data = model_logic.add_features(bars, symbol)
+    feature_cols = entry.meta["feature_cols"]
+    if any(c not in stock_data.columns for c in feature_cols):
+        return None, "Model features are not available for this ticker"
+    seq_len = entry.meta.get("seq_len", model_logic.SEQ_LEN)
+    if len(stock_data) < seq_len:
+        return None, "Not enough data to predict."
+    window = entry.scaler.transform(stock_data[feature_cols].values[-seq_len:].astype(float)).astype(np.float32)
+    return {"symbol": symbol, "entry": entry, "window": window, "stock_data": stock_data}, None
+
+
+def predict_batch(tickers):
+    """
+    Next-days forecasts for many tickers. Returns {"results": [...]} with one item
+    per unique ticker, either a forecast or an "error" for that ticker alone.
+    """
+    tickers = list(dict.fromkeys(t.upper().strip() for t in tickers if t and t.strip()))
+    results = {}
+    try:
+        with metrics.span("download"):
+            loaded = data_store.get_default_store().load_many(tickers)
+    except Exception as e:
+        return {"error": f"Failed to download stock data: {str(e)}"}
+
+    groups = {}
+    for ticker in tickers:
+        symbol, bars = loaded.get(ticker, (ticker, None))
+        prepared, error = _prepare(ticker, symbol, bars)
+        if error:
+            results[ticker] = {"ticker": ticker, "symbol": symbol, "error": error}
+            continue
+        groups.setdefault(architecture_key(prepared["entry"].meta), []).append((ticker, prepared))
+
+    for key, members in groups.items():
+        feature_cols, num_layers = list(key[0]), key[3]
+        close_index = feature_cols.index('Close')
+        # (M, seq_len, n_features): one window per model
+        windows = torch.from_numpy(np.stack([p["window"] for _, p in members]))
+
+        with metrics.span("forecasting"):
+            if STACK_MIN_MODELS and len(members) >= STACK_MIN_MODELS:
+                stacked = stack_models([p["entry"].model for _, p in members])
+
+                def predict_fn(x, stacked=stacked, num_layers=num_layers):
+                    return stacked_forward(stacked, x.unsqueeze(1), num_layers)[:, 0]
+                future_scaled = model_logic.roll_forecast(predict_fn, windows, close_index, FORECAST_DAYS).numpy()
+            else:
+                future_scaled = np.concatenate([
+                    model_logic.roll_forecast(p["entry"].inference, windows[m:m + 1], close_index, FORECAST_DAYS).numpy()
+                    for m, (_, p) in enumerate(members)])
+
+        for (ticker, prepared), scaled in zip(members, future_scaled):
+            entry, stock_data = prepared["entry"], prepared["stock_data"]
+            prices = model_logic.inverse_close(entry.scaler, scaled, close_index, len(feature_cols)).tolist()
+            results[ticker] = {
+                "ticker": ticker,
+                "symbol": prepared["symbol"],
+                "as_of": str(stock_data['Date'].iloc[-1].date()),
+                "last_close": float(stock_data['Close'].iloc[-1]),
+                "predicted_prices": prices,
+                "final_predicted_price": prices[-1],
+                "trend": "UP" if prices[-1] > prices[-2] else "DOWN",
+                "model_version": entry.version,
+            }
+
+    return {"results": [results[t] for t in tickers]}
@@ -0,0 +1,74 @@
+"""
+Stacked multi-model forward (batch_inference.stacked_forward) vs one StockLSTM
+forward per ticker, for the 3-day rolled forecast /predict/batch runs.
+
+    cd ml_service
+    python benchmarks/bench_batch_inference.py --models 1 10 50 --threads 1
+
+Random-weight models, so no data or trained models are needed. The service
+only stacks groups of at least batch_inference.STACK_MIN_MODELS models (off by
+default); set it from the smallest group size where "speedup" exceeds 1.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_inference
+import model_logic
+
+
+def median_ms(fn, repeats):
+    samples = []
+    with torch.no_grad():
+        fn()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+    return float(np.median(samples) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--num-layers", type=int, default=model_logic.NUM_LAYERS)
+    parser.add_argument("--hidden-dim", type=int, default=model_logic.HIDDEN_DIM)
+    parser.add_argument("--threads", type=int, default=1, help="torch threads (the service runs 1-2 per worker)")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    input_dim = len(model_logic.FEATURE_COLS)
+    close_index = model_logic.FEATURE_COLS.index('Close')
+    days = batch_inference.FORECAST_DAYS
+    config = {"hidden_dim": args.hidden_dim, "num_layers": args.num_layers}
+
+    print(f"{'models':>7} {'loop ms':>9} {'stacked ms':>11} {'speedup':>8} {'max |diff|':>11}")
+    for n_models in args.models:
+        torch.manual_seed(0)
+        models = [model_logic.build_model(config).eval() for _ in range(n_models)]
+        windows = torch.rand(n_models, model_logic.SEQ_LEN, input_dim)
+
+        def loop():
+            return torch.stack([model_logic.roll_forecast(model, windows[m:m + 1], close_index, days)[0]
+                                for m, model in enumerate(models)])
+
+        def stacked():
+            weights = batch_inference.stack_models(models)
+            predict_fn = lambda x: batch_inference.stacked_forward(weights, x.unsqueeze(1), args.num_layers)[:, 0]
+            return model_logic.roll_forecast(predict_fn, windows, close_index, days)
+
+        with torch.no_grad():
+            max_diff = float((loop() - stacked()).abs().max())
+        loop_ms, stacked_ms = median_ms(loop, args.repeats), median_ms(stacked, args.repeats)
+        print(f"{n_models:>7} {loop_ms:>9.2f} {stacked_ms:>11.2f} {loop_ms / stacked_ms:>7.1f}x {max_diff:>11.2e}")
+
+
+if __name__ == "__main__":
+    main()
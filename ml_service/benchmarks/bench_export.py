@@ -0,0 +1,62 @@
+"""
+Float StockLSTM vs its int8 dynamically quantized TorchScript export
+(inference_export.py): serialized size, forward latency and output drift.
+
+    cd ml_service
+    python benchmarks/bench_export.py --batch 1 64 512 --threads 1
+    python benchmarks/bench_export.py --model AAPL     # a trained model instead of random weights
+
+Random-weight models need no data. The drift column is the max relative
+difference of first-step outputs mapped to a 100-200 price range.
+"""
+import os
+import sys
+import argparse
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference_export
+import model_logic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 64, 512])
+    parser.add_argument("--hidden-dim", type=int, default=model_logic.HIDDEN_DIM)
+    parser.add_argument("--threads", type=int, default=1, help="torch threads (the service runs 1-2 per worker)")
+    parser.add_argument("--model", help="registered model key to benchmark instead of random weights")
+    parser.add_argument("--repeats", type=int, default=inference_export.TIMING_REPEATS)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    if args.model:
+        entry = model_logic.registry.get(args.model.upper())
+        if entry is None:
+            parser.error(f"no trained model for {args.model}")
+        float_model, input_dim = entry.model, len(entry.meta["feature_cols"])
+    else:
+        float_model = model_logic.build_model({"hidden_dim": args.hidden_dim}).eval()
+        input_dim = len(model_logic.FEATURE_COLS)
+
+    example = torch.rand(1, model_logic.SEQ_LEN, input_dim)
+    variants = {
+        "float": float_model,
+        "torchscript": inference_export.compile_model(float_model, example),
+        "int8": inference_export.quantize(float_model),
+        "int8+torchscript": inference_export.compile_model(inference_export.quantize(float_model), example),
+    }
+
+    windows = torch.rand(max(args.batch), model_logic.SEQ_LEN, input_dim)
+    print(f"{'variant':<18} {'size KB':>8} {'max drift':>10}" + "".join(f"{f'b={b} ms':>11}" for b in args.batch))
+    for name, model in variants.items():
+        drift = inference_export.measure_drift(float_model, model, windows, lambda s: 150 + 50 * s)
+        latencies = [inference_export.time_forward(model, windows[:b], args.repeats) for b in args.batch]
+        print(f"{name:<18} {inference_export.serialized_size(model) / 1024:>8.1f} {drift['max_rel_error']:>10.4%}"
+              + "".join(f"{ms:>11.3f}" for ms in latencies))
+
+
+if __name__ == "__main__":
+    main()
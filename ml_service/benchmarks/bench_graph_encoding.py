@@ -0,0 +1,78 @@
+"""
+/predict graph_data encodings (graph_encoding.py): body size, gzipped size and
+encode time of the full JSON payload vs downsampled / compact variants.
+
+    cd ml_service
+    python benchmarks/bench_graph_encoding.py --points 500 1500 --max-points 300
+
+Uses a synthetic random-walk series, so it needs no data or trained model.
+msgpack rows are skipped when msgpack isn't installed.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import graph_encoding
+
+FORECAST_DAYS = 3
+
+
+def synthetic_result(points, seed=0):
+    rng = random.Random(seed)
+    start = datetime.date(2020, 1, 1)
+    dates = [(start + datetime.timedelta(days=i)).isoformat() for i in range(points + FORECAST_DAYS)]
+    actual, price = [], 150.0
+    for _ in range(points):
+        price *= 1 + rng.gauss(0, 0.015)
+        actual.append(price)
+    predicted = [p * (1 + rng.gauss(0, 0.01)) for p in actual] + [price * (1 + 0.002 * d) for d in range(1, FORECAST_DAYS + 1)]
+    return {"ticker": "SYNTH", "graph_data": {"dates": dates, "actual": actual + [None] * FORECAST_DAYS, "predicted": predicted}}
+
+def time_render(result, options, accept, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        body, media_type = graph_encoding.render(graph_encoding.apply(result, options), options, accept)
+        samples.append(time.perf_counter() - start)
+    return body, media_type, sorted(samples)[len(samples) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, nargs="+", default=[500, 1500])
+    parser.add_argument("--max-points", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    variants = {
+        "full json": (graph_encoding.GraphOptions(), None),
+        "float32 + delta": (graph_encoding.GraphOptions(None, "delta", "float32"), None),
+        "lttb": (graph_encoding.GraphOptions(args.max_points), None),
+        "lttb + compact": (graph_encoding.GraphOptions(args.max_points, "delta", "float32"), None),
+        "lttb + msgpack": (graph_encoding.GraphOptions(args.max_points, "epoch_days", "float32"), "application/msgpack"),
+    }
+    print(f"{'points':>7} {'variant':<16} {'bytes':>9} {'gzip':>8} {'encode ms':>10}")
+    for points in args.points:
+        result = synthetic_result(points)
+        # What the service sent before: JSONResponse's default json.dumps
+        start = time.perf_counter()
+        baseline = json.dumps(result).encode("utf-8")
+        print(f"{points:>7} {'before':<16} {len(baseline):>9} {len(gzip.compress(baseline)):>8} "
+              f"{(time.perf_counter() - start) * 1000:>10.3f}")
+        for name, (options, accept) in variants.items():
+            body, media_type, ms = time_render(result, options, accept, args.repeats)
+            if accept and media_type != accept:
+                print(f"{points:>7} {name:<16} {'(msgpack not installed)':>28}")
+                continue
+            print(f"{points:>7} {name:<16} {len(body):>9} {len(gzip.compress(body)):>8} {ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Checks the streaming indicator engine against the original pandas features and
+times a full pandas recompute against an incremental one-bar update.
+
+    cd ml_service
+    python benchmarks/bench_indicators.py --rows 2000 10000
+
+Exact equality is asserted by tests/test_indicators.py (python -m pytest tests).
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import indicators
+
+
+def pandas_features(close):
+    """The feature block get_stock_prediction used before the streaming engine."""
+    df = pd.DataFrame({"Close": close})
+    df['MA5'] = df['Close'].rolling(5).mean().fillna(0)
+    df['MA10'] = df['Close'].rolling(10).mean().fillna(0)
+    delta = df['Close'].diff()
+    up = delta.clip(lower=0)
+    down = -1 * delta.clip(upper=0)
+    rs = up.rolling(14).mean() / down.rolling(14).mean().replace(0, 1e-9)
+    df['RSI14'] = (100 - (100 / (1 + rs))).fillna(50)
+    return df[['MA5', 'MA10', 'RSI14']].to_numpy()
+
+
+def synthetic_closes(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    # Flat stretches exercise the same-value and zero-loss branches
+    close[rows // 3: rows // 3 + 20] = close[rows // 3]
+    return np.round(close, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[2000, 10000])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        close = synthetic_closes(rows + 1)
+        dates = np.arange(rows + 1).astype("datetime64[D]")
+
+        expected = pandas_features(close)
+        got = indicators.IndicatorEngine().run(close)
+        mismatches = int((~((expected == got) | (np.isnan(expected) & np.isnan(got)))).sum())
+        max_diff = float(np.nanmax(np.abs(expected - got)))
+
+        start = time.perf_counter()
+        pandas_features(close)
+        pandas_ms = (time.perf_counter() - start) * 1000
+
+        cache = indicators.FeatureCache()
+        cache.compute("BENCH", dates[:-1], close[:-1])
+        start = time.perf_counter()
+        incremental = cache.compute("BENCH", dates, close)
+        incremental_ms = (time.perf_counter() - start) * 1000
+        assert np.array_equal(incremental, got)
+
+        print(f"rows={rows:>6}  mismatching values={mismatches}  max |diff|={max_diff:.3g}  "
+              f"pandas full={pandas_ms:.2f}ms  incremental +1 bar={incremental_ms:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
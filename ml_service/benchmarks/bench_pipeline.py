@@ -0,0 +1,346 @@
+"""
+Offline benchmark of the prediction pipeline and the HTTP endpoints.
+
+Synthetic (seeded, deterministic) OHLCV bars are written as CSV files and served
+through data_store.CSVFileSource, so nothing talks to Yahoo. Two phases:
+
+  stages  the steps of get_stock_prediction timed one by one for cold tickers
+          (download, features, scaling, windowing, training, validation
+          inference, forecasting), plus the whole call once the model exists
+  http    /predict (prediction cache on and off) and /dashboard through
+          FastAPI's TestClient, N requests at a given concurrency
+
+Reports p50/p95/p99 latency, throughput and peak RSS. Results can be saved as a
+baseline and later runs compared against it (exit code 1 on a regression).
+
+    cd ml_service
+    python benchmarks/bench_pipeline.py --tickers 4 --save benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --tickers 4 --compare benchmarks/baseline.json
+
+--source-dir uses recorded bars instead (<SYMBOL>.csv with Date, Open, High,
+Low, Close, Volume columns, the CSVFileSource layout).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STAGES = ["download", "features", "scaling", "windowing", "training", "validation_inference", "forecasting"]
+# Dashboard symbols (see model_logic.DASHBOARD_INDICES / HISTORY_TICKERS / TRENDING_SYMBOLS)
+DASHBOARD_SYMBOLS = ["^GSPC", "^DJI", "^IXIC", "^VIX", "AAPL", "NVDA", "MSFT", "TSLA", "AMZN",
+                     "RELIANCE.NS", "TCS.NS", "INFY.NS", "HDFCBANK.NS"]
+# Bars end here so the data (and the results) don't depend on the day the benchmark runs
+LAST_BAR = "2024-12-31"
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def percentiles(samples):
+    values = np.asarray(samples, dtype=float) * 1000
+    if len(values) == 0:
+        return {"n": 0}
+    return {
+        "n": int(len(values)),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+# --- Fixtures ---
+def synthetic_ohlcv(rows, seed):
+    """Geometric random walk with a consistent Open/High/Low/Close/Volume per business day."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=LAST_BAR, periods=rows)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, rows)))
+    open_ = np.concatenate([[close[0]], close[:-1]]) * (1 + rng.normal(0, 0.003, rows))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, rows))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, rows))
+    volume = rng.integers(1_000_000, 5_000_000, rows)
+    return pd.DataFrame({"Date": dates, "Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume})
+
+def write_fixtures(directory, symbols, rows, seed):
+    os.makedirs(directory, exist_ok=True)
+    for i, symbol in enumerate(symbols):
+        frame = synthetic_ohlcv(rows, seed + i)
+        frame[OHLCV] = frame[OHLCV].round(4)
+        frame.to_csv(os.path.join(directory, f"{symbol}.csv"), index=False)
+
+
+def offline_dashboard(model_logic, data_store):
+    """get_dashboard_data with its Yahoo calls answered from the local store."""
+    store = data_store.get_default_store()
+
+    def fetch_quote(symbol, session=None):
+        _, bars = store.load(symbol)
+        if bars is None or len(bars) < 2:
+            return None, None
+        return float(bars['Close'].iloc[-1]), float(bars['Close'].iloc[-2])
+
+    def fetch_weekly_performance(session=None):
+        closes = {sym: store.load(sym)[1].set_index('Date')['Close'].iloc[-5:] for sym in model_logic.HISTORY_TICKERS.split()}
+        frame = pd.DataFrame(closes)
+        return [{"name": date.strftime('%a'), "sp500": row.get('^GSPC', 0), "nasdaq": row.get('^IXIC', 0),
+                 "dow": row.get('^DJI', 0)} for date, row in frame.iterrows()]
+
+    def fetch_market_news(session=None):
+        return [{"headline": "Synthetic market headline", "date": LAST_BAR, "summary": "", "source": "Benchmark", "url": "#"}]
+
+    model_logic.fetch_quote = fetch_quote
+    model_logic.fetch_weekly_performance = fetch_weekly_performance
+    model_logic.fetch_market_news = fetch_market_news
+    return model_logic.get_dashboard_data
+
+
+# --- Phase 1: pipeline stages ---
+def run_stages(tickers, train_config):
+    import torch
+    from sklearn.preprocessing import MinMaxScaler
+    import data_store
+    import model_logic
+
+    timings = {name: [] for name in STAGES + ["total_cold", "predict_warm"]}
+    rss_delta = {name: 0.0 for name in timings}
+
+    def timed(name, fn, *args):
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        out = fn(*args)
+        timings[name].append(time.perf_counter() - start)
+        rss_delta[name] = max(rss_delta[name], peak_rss_mb() - rss_before)
+        return out
+
+    store = data_store.get_default_store()
+    for ticker in tickers:
+        started = time.perf_counter()
+        symbol, bars = timed("download", store.load, ticker)
+        stock_data = timed("features", model_logic.add_features, bars, symbol)
+        feature_cols = [c for c in model_logic.FEATURE_COLS if c in stock_data.columns]
+        close_index = feature_cols.index('Close')
+
+        scaler = MinMaxScaler()
+        data_scaled = timed("scaling", scaler.fit_transform, stock_data[feature_cols].values.astype(float))
+        X_tensor, y_tensor, split_idx = timed("windowing", model_logic.split_windows, data_scaled, close_index)
+        entry = timed("training", model_logic.train_and_save, symbol, stock_data, feature_cols, scaler,
+                      X_tensor, y_tensor, split_idx, train_config)
+        model = entry.model.eval()
+
+        def validate():
+            with torch.no_grad():
+                return model(X_tensor[split_idx:])[:, 0].numpy()
+        y_pred = timed("validation_inference", validate)
+        model_logic.inverse_close(scaler, y_pred, close_index, len(feature_cols))
+
+        def forecast():
+            last_window = torch.from_numpy(data_scaled[-model_logic.SEQ_LEN:].astype(np.float32)).unsqueeze(0)
+            future = model_logic.roll_forecast(model, last_window, close_index, 3)[0].numpy()
+            return model_logic.inverse_close(scaler, future, close_index, len(feature_cols))
+        timed("forecasting", forecast)
+        timings["total_cold"].append(time.perf_counter() - started)
+
+        # Same ticker again: stored bars, incremental features, registered model
+        timed("predict_warm", model_logic.get_stock_prediction, ticker)
+
+    return {
+        "latency": {name: percentiles(samples) for name, samples in timings.items()},
+        "peak_rss_delta_mb": rss_delta,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# --- Phase 2: HTTP ---
+def load_test(client, method, path, bodies, concurrency):
+    """Sends len(bodies) requests with `concurrency` in flight. Returns latency/throughput stats."""
+    def one(body):
+        start = time.perf_counter()
+        response = client.post(path, json=body) if method == "POST" else client.get(path)
+        return time.perf_counter() - start, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, bodies))
+    wall = time.perf_counter() - started
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        **percentiles([seconds for seconds, _ in results]),
+        "throughput_rps": len(results) / wall if wall else 0.0,
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "errors": sum(1 for _, status in results if status != 200),
+    }
+
+def run_http(tickers, n_requests, concurrency):
+    from fastapi.testclient import TestClient
+    import data_store
+    import model_logic
+    import dashboard_service
+    import main
+
+    dashboard_service.service = dashboard_service.DashboardSnapshotService(
+        fetch=offline_dashboard(model_logic, data_store))
+    bodies = [{"stock_name": tickers[i % len(tickers)]} for i in range(n_requests)]
+
+    results = {}
+    with TestClient(main.app) as client:
+        # Untimed pass: every ticker's prediction is computed (and cached) once
+        for body in bodies[:len(tickers)]:
+            client.post("/predict", json=body)
+
+        results["predict_cached"] = load_test(client, "POST", "/predict", bodies, concurrency)
+
+        max_entries = main.prediction_cache.max_entries
+        main.prediction_cache.max_entries = 0  # every put is evicted immediately
+        try:
+            results["predict_uncached"] = load_test(client, "POST", "/predict", bodies, concurrency)
+        finally:
+            main.prediction_cache.max_entries = max_entries
+
+        results["dashboard"] = load_test(client, "GET", "/dashboard", [None] * n_requests, concurrency)
+
+    return {"endpoints": results, "peak_rss_mb": peak_rss_mb()}
+
+
+# --- Baselines ---
+def flat_metrics(report):
+    """{"stages.training.p50_ms": ..., "http.dashboard.throughput_rps": ...} for comparisons."""
+    metrics = {}
+    for name, stats in report.get("stages", {}).get("latency", {}).items():
+        for key in ("p50_ms", "p95_ms"):
+            if key in stats:
+                metrics[f"stages.{name}.{key}"] = stats[key]
+    for name, stats in report.get("http", {}).get("endpoints", {}).items():
+        for key in ("p50_ms", "p95_ms", "throughput_rps"):
+            if key in stats:
+                metrics[f"http.{name}.{key}"] = stats[key]
+    for phase in ("stages", "http"):
+        if "peak_rss_mb" in report.get(phase, {}):
+            metrics[f"{phase}.peak_rss_mb"] = report[phase]["peak_rss_mb"]
+    return metrics
+
+def compare(report, baseline, tolerance):
+    """Prints current vs baseline per metric. Returns the names of the metrics that regressed."""
+    current, previous = flat_metrics(report), flat_metrics(baseline)
+    regressions = []
+    print(f"\n{'metric':<45} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(set(current) & set(previous)):
+        old, new = previous[name], current[name]
+        change = (new - old) / old if old else 0.0
+        # Higher is better for throughput, lower is better for everything else
+        worse = change < -tolerance if name.endswith("throughput_rps") else change > tolerance
+        if worse:
+            regressions.append(name)
+        print(f"{name:<45} {old:>10.2f} {new:>10.2f} {change:>+7.0%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def print_report(report):
+    if "stages" in report:
+        print(f"\n{'stage':<22} {'n':>3} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak RSS +MB':>13}")
+        deltas = report["stages"]["peak_rss_delta_mb"]
+        for name, stats in report["stages"]["latency"].items():
+            delta = f"{deltas[name]:>13.1f}" if name in deltas else f"{'':>13}"
+            print(f"{name:<22} {stats['n']:>3} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {delta}")
+        print(f"peak RSS after stages: {report['stages']['peak_rss_mb']:.0f} MB")
+    if "http" in report:
+        print(f"\n{'endpoint':<18} {'n':>5} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'errors':>7}")
+        for name, stats in report["http"]["endpoints"].items():
+            print(f"{name:<18} {stats['n']:>5} {stats['concurrency']:>5} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+                  f"{stats['p99_ms']:>9.1f} {stats['throughput_rps']:>8.1f} {stats['errors']:>7}")
+        print(f"peak RSS after http: {report['http']['peak_rss_mb']:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=4, help="synthetic tickers (each one is trained once)")
+    parser.add_argument("--rows", type=int, default=1500, help="bars per synthetic ticker")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--source-dir", help="recorded <SYMBOL>.csv bars to use instead of synthetic ones")
+    parser.add_argument("--symbols", nargs="+", help="symbols to benchmark from --source-dir")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--time-budget", type=float, default=30)
+    parser.add_argument("--requests", type=int, default=100, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--skip-stages", action="store_true")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--workdir", help="keep the store / models here instead of a temp dir")
+    parser.add_argument("--save", metavar="PATH", help="write the report as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="stockvision-bench-")
+    source_dir = args.source_dir or os.path.join(workdir, "source")
+    if args.source_dir:
+        tickers = args.symbols or sorted(f[:-4] for f in os.listdir(source_dir) if f.endswith(".csv"))
+    else:
+        tickers = [f"SYN{i:03d}" for i in range(args.tickers)]
+        write_fixtures(source_dir, tickers + DASHBOARD_SYMBOLS, args.rows, args.seed)
+
+    # Read at import time by data_store / model_registry / jobs / warmup
+    os.environ["STOCKVISION_DATA_SOURCE_DIR"] = source_dir
+    os.environ["STOCKVISION_DATA_DIR"] = os.path.join(workdir, "market_data")
+    os.environ["STOCKVISION_MODEL_DIR"] = os.path.join(workdir, "saved_models")
+    os.environ["STOCKVISION_EXECUTOR"] = args.executor
+    os.environ.setdefault("STOCKVISION_SENTIMENT", "off")
+    os.environ.setdefault("STOCKVISION_WARMUP", "0")
+
+    import training
+    train_config = training.TrainingConfig(max_epochs=args.epochs, time_budget=args.time_budget)
+
+    report = {
+        "meta": {
+            "tickers": len(tickers), "rows": args.rows, "seed": args.seed, "source_dir": args.source_dir,
+            "epochs": args.epochs, "requests": args.requests, "concurrency": args.concurrency,
+            "executor": args.executor, "python": platform.python_version(), "machine": platform.machine(),
+            "cpu_count": os.cpu_count(), "created_at": time.time(),
+        }
+    }
+    try:
+        if not args.skip_stages:
+            report["stages"] = run_stages(tickers, train_config)
+        if not args.skip_http:
+            if args.skip_stages:
+                # /predict needs trained models
+                import model_logic
+                for ticker in tickers:
+                    model_logic.get_stock_prediction(ticker, train_config)
+            report["http"] = run_http(tickers, args.requests, args.concurrency)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
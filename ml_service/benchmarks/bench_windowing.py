@@ -0,0 +1,88 @@
+"""
+Compares the old Python-loop sequence builder with windowing.window_tensors.
+
+    cd ml_service
+    python benchmarks/bench_windowing.py --rows 2000 5000 20000 --seq-len 60 120
+
+Each variant runs in its own subprocess so peak RSS is measured in isolation.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+N_FEATURES = 8
+TARGET_INDEX = 3
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def build_loop(data, seq_len):
+    import numpy as np
+    import torch
+    X, y = [], []
+    for i in range(seq_len, len(data)):
+        X.append(data[i-seq_len:i])
+        y.append(data[i, TARGET_INDEX])
+    X, y = np.array(X), np.array(y)
+    return torch.from_numpy(X).float(), torch.from_numpy(y).float()
+
+
+def build_strided(data, seq_len):
+    import windowing
+    return windowing.window_tensors(data, seq_len, TARGET_INDEX)
+
+
+def run_variant(variant, rows, seq_len):
+    import numpy as np
+    import torch  # noqa: F401  (imported up front so it isn't counted in the delta)
+    data = np.random.default_rng(0).random((rows, N_FEATURES))
+    baseline = peak_rss_mb()
+    builder = build_loop if variant == "loop" else build_strided
+    start = time.perf_counter()
+    X, y = builder(data, seq_len)
+    # Touch one batch the way training would, so lazy views pay their copy too
+    _ = X[:64].contiguous().sum()
+    elapsed = time.perf_counter() - start
+    return {"variant": variant, "rows": rows, "seq_len": seq_len,
+            "seconds": elapsed, "peak_rss_delta_mb": peak_rss_mb() - baseline,
+            "shape": list(X.shape)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[2000, 10000])
+    parser.add_argument("--seq-len", type=int, nargs="+", default=[60, 120])
+    parser.add_argument("--child", nargs=3, metavar=("VARIANT", "ROWS", "SEQ_LEN"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        variant, rows, seq_len = args.child
+        print(json.dumps(run_variant(variant, int(rows), int(seq_len))))
+        return
+
+    print(f"{'rows':>7} {'seq':>4} {'variant':>8} {'time (ms)':>10} {'peak RSS +MB':>13}")
+    for rows in args.rows:
+        for seq_len in args.seq_len:
+            results = {}
+            for variant in ("loop", "strided"):
+                out = subprocess.run([sys.executable, __file__, "--child", variant, str(rows), str(seq_len)],
+                                     capture_output=True, text=True, check=True)
+                results[variant] = json.loads(out.stdout.strip().splitlines()[-1])
+                r = results[variant]
+                print(f"{rows:>7} {seq_len:>4} {variant:>8} {r['seconds'] * 1000:>10.1f} {r['peak_rss_delta_mb']:>13.1f}")
+            speedup = results["loop"]["seconds"] / max(results["strided"]["seconds"], 1e-9)
+            print(f"{'':>13} speedup x{speedup:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Dashboard snapshot service.
+# A background thread rebuilds the /dashboard payload every REFRESH_SECONDS,
+# fetching every symbol concurrently over one pooled HTTP session. Handlers
+# only ever read the latest snapshot from memory.
+
+REFRESH_SECONDS = int(os.environ.get("STOCKVISION_DASHBOARD_REFRESH_SECONDS", "60"))
+# A snapshot older than this many refresh intervals is reported as stale
+STALE_AFTER_INTERVALS = 3
+
+
+def make_session(pool_size=32):
+    """
+    Shared HTTP session for yfinance. Recent yfinance releases only accept
+    curl_cffi sessions, so use one when it is installed.
+    """
+    try:
+        from curl_cffi import requests as curl_requests
+        return curl_requests.Session(impersonate="chrome")
+    except ImportError:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+
+class DashboardSnapshotService:
+    def __init__(self, refresh_seconds=REFRESH_SECONDS, fetch=None):
+        self.refresh_seconds = refresh_seconds
+        self._fetch = fetch
+        self._session = make_session()
+        self._pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="dashboard")
+        self._snapshot = None
+        self._updated_at = None
+        self._last_error = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _get_fetch(self):
+        if self._fetch is None:
+            import model_logic # Heavy (torch, pandas); keep it off the app import path
+            self._fetch = model_logic.get_dashboard_data
+        return self._fetch
+
+    def refresh(self):
+        """Rebuilds the snapshot. Concurrent callers wait for the refresh already running."""
+        with self._refresh_lock:
+            started = time.time()
+            try:
+                with metrics.span("dashboard", metrics.UPSTREAM_SECONDS):
+                    self._snapshot = self._get_fetch()(session=self._session, pool=self._pool)
+                self._updated_at = time.time()
+                self._last_error = None
+                print(f"Dashboard snapshot refreshed in {self._updated_at - started:.2f}s")
+            except Exception as e:
+                self._last_error = str(e)
+                print(f"Dashboard Error: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_seconds)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="dashboard-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._pool.shutdown(wait=False)
+
+    @property
+    def has_snapshot(self):
+        return self._snapshot is not None
+
+    def get(self):
+        """Latest dashboard payload plus a `snapshot` block with staleness metadata."""
+        if self._snapshot is None:
+            # Nothing built yet (first request raced the background thread)
+            self.refresh()
+        if self._snapshot is None:
+            raise RuntimeError(self._last_error or "Dashboard data is not available yet")
+
+        age = time.time() - self._updated_at
+        return {
+            **self._snapshot,
+            "snapshot": {
+                "updated_at": self._updated_at,
+                "age_seconds": age,
+                "refresh_seconds": self.refresh_seconds,
+                "stale": age > self.refresh_seconds * STALE_AFTER_INTERVALS,
+                "last_error": self._last_error,
+            },
+        }
+
+
+service = DashboardSnapshotService()
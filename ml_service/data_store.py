@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import threading
+import datetime
+import numpy as np
+import pandas as pd
+
+# Local incremental OHLCV store.
+# Each resolved symbol gets its own folder with one memory-mapped NumPy file:
+#   market_data/<SYMBOL>/bars.npy  -> structured (n_bars,) array of
+#                                     date: int64 days since epoch
+#                                     values: float64 (5,) Open/High/Low/Close/Volume
+# Dates and values live in the same file so a single atomic rename replaces both
+# (workers read a symbol while another one updates it).
+# On every request only the bars newer than the last stored one are downloaded.
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+BARS_DTYPE = np.dtype([('date', np.int64), ('values', np.float64, (len(OHLCV_COLUMNS),))])
+HISTORY_START = "2018-01-01"
+
+DATA_DIR = os.environ.get("STOCKVISION_DATA_DIR", "market_data")
+# Don't ask upstream again for a symbol that was refreshed less than this many seconds ago
+REFRESH_INTERVAL = int(os.environ.get("STOCKVISION_DATA_REFRESH_SECONDS", "900"))
+
+
+# --- Helper Functions ---
+def flatten_columns(df):
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = ['_'.join([str(i) for i in col if i]) for col in df.columns]
+    df.columns = df.columns.str.strip()
+    return df
+
+def canonicalize_ohlcv_names(df):
+    rename_map = {}
+    for col in df.columns:
+        c = str(col).strip().lower()
+        if 'open' in c: rename_map[col] = 'Open'
+        if 'high' in c: rename_map[col] = 'High'
+        if 'low' in c: rename_map[col] = 'Low'
+        if 'close' in c: rename_map[col] = 'Close'
+        if 'volume' in c: rename_map[col] = 'Volume'
+    if rename_map:
+        df = df.rename(columns=rename_map)
+    return df
+
+def normalize_ohlcv(df):
+    """Turns a raw download into a Date + OHLCV frame sorted by date."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=['Date'] + OHLCV_COLUMNS)
+    df = df.reset_index()
+    df = flatten_columns(df)
+    df = canonicalize_ohlcv_names(df)
+    if 'Date' not in df.columns:
+        for col in df.columns:
+            if str(col).lower() in ('date', 'datetime', 'index'):
+                df = df.rename(columns={col: 'Date'})
+                break
+    # 'Adj Close' also canonicalizes to 'Close', keep the first one
+    df = df.loc[:, ~df.columns.duplicated()]
+    missing = [c for c in ['Date'] + OHLCV_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Downloaded data is missing columns: {missing}")
+    df = df[['Date'] + OHLCV_COLUMNS].dropna(subset=['Close'])
+    df['Date'] = pd.to_datetime(df['Date']).dt.tz_localize(None).dt.normalize()
+    return df.sort_values('Date').drop_duplicates('Date', keep='last').reset_index(drop=True)
+
+
+# --- Data Sources ---
+class DataSource:
+    """Where bars come from. fetch() returns a Date + OHLCV frame for [start, end)."""
+
+    def fetch(self, symbol, start, end):
+        raise NotImplementedError
+
+    def fetch_many(self, symbols, start, end):
+        """Bulk fetch, {symbol: frame}. Sources with a real bulk API override this."""
+        return {symbol: self.fetch(symbol, start, end) for symbol in symbols}
+
+class YFinanceSource(DataSource):
+    def fetch(self, symbol, start, end):
+        import yfinance as yf
+        raw = yf.download(symbol, start=start, end=end, progress=False)
+        return normalize_ohlcv(raw)
+
+    def fetch_many(self, symbols, start, end):
+        import yfinance as yf
+        symbols = list(symbols)
+        raw = yf.download(symbols, start=start, end=end, progress=False, group_by='ticker', threads=True)
+        frames = {}
+        for symbol in symbols:
+            if isinstance(raw.columns, pd.MultiIndex):
+                if symbol not in raw.columns.get_level_values(0):
+                    frames[symbol] = normalize_ohlcv(None)
+                    continue
+                part = raw[symbol].dropna(how='all')
+            else:
+                part = raw
+            frames[symbol] = normalize_ohlcv(part)
+        return frames
+
+class CSVFileSource(DataSource):
+    """
+    File-backed source for tests and offline runs.
+    Reads <directory>/<SYMBOL>.csv with Date, Open, High, Low, Close, Volume columns.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, symbol, start, end):
+        path = os.path.join(self.directory, f"{symbol}.csv")
+        if not os.path.exists(path):
+            return normalize_ohlcv(None)
+        df = normalize_ohlcv(pd.read_csv(path, parse_dates=['Date']).set_index('Date'))
+        mask = (df['Date'] >= pd.Timestamp(start)) & (df['Date'] < pd.Timestamp(end))
+        return df[mask].reset_index(drop=True)
+
+
+# --- Store ---
+def write_atomic(path, writer):
+    """Calls writer(tmp_path) then renames over `path`, so readers never see a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    writer(tmp_path)
+    os.replace(tmp_path, path)
+
+def _save_npy(path, array):
+    def writer(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+    write_atomic(path, writer)
+
+def _save_json(path, payload):
+    def writer(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f)
+    write_atomic(path, writer)
+
+def _load_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+class OHLCVStore:
+    def __init__(self, root=DATA_DIR, source=None, refresh_interval=REFRESH_INTERVAL):
+        self.root = root
+        self.source = source or YFinanceSource()
+        self.refresh_interval = refresh_interval
+        self._resolutions_path = os.path.join(root, "resolutions.json")
+
+    # Symbol resolution (plain ticker vs .NS listing)
+    def resolved_symbol(self, ticker):
+        return _load_json(self._resolutions_path, {}).get(ticker)
+
+    def _remember_resolution(self, ticker, symbol):
+        resolutions = _load_json(self._resolutions_path, {})
+        if resolutions.get(ticker) != symbol:
+            resolutions[ticker] = symbol
+            os.makedirs(self.root, exist_ok=True)
+            _save_json(self._resolutions_path, resolutions)
+
+    def candidate_symbols(self, ticker):
+        known = self.resolved_symbol(ticker)
+        if known:
+            return [known]
+        if ticker.endswith('.NS'):
+            return [ticker]
+        return [ticker, f"{ticker}.NS"]
+
+    # Per-symbol bars
+    def _symbol_dir(self, symbol):
+        return os.path.join(self.root, symbol)
+
+    def read(self, symbol):
+        """Returns the stored bars for a symbol (memory-mapped), or None."""
+        folder = self._symbol_dir(symbol)
+        try:
+            bars = np.load(os.path.join(folder, "bars.npy"), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        df = pd.DataFrame(np.asarray(bars['values']), columns=OHLCV_COLUMNS)
+        df.insert(0, 'Date', pd.to_datetime(np.asarray(bars['date']), unit='D'))
+        return df
+
+    def meta(self, symbol):
+        return _load_json(os.path.join(self._symbol_dir(symbol), "meta.json"), {})
+
+    def last_checked(self, symbol):
+        return self.meta(symbol).get("checked_at", 0)
+
+    def is_fresh(self, symbol):
+        """True when the stored bars were synced with the source within refresh_interval."""
+        return time.time() - self.last_checked(symbol) < self.refresh_interval
+
+    def _write(self, symbol, df):
+        folder = self._symbol_dir(symbol)
+        os.makedirs(folder, exist_ok=True)
+        bars = np.empty(len(df), dtype=BARS_DTYPE)
+        bars['date'] = df['Date'].values.astype('datetime64[D]').astype(np.int64)
+        bars['values'] = df[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+        _save_npy(os.path.join(folder, "bars.npy"), bars)
+        self._touch(symbol, last_date=str(df['Date'].iloc[-1].date()), bars=len(df))
+
+    def _touch(self, symbol, **extra):
+        meta_path = os.path.join(self._symbol_dir(symbol), "meta.json")
+        meta = _load_json(meta_path, {})
+        meta.update(extra)
+        meta["checked_at"] = time.time()
+        _save_json(meta_path, meta)
+
+    def _merge(self, symbol, stored, fresh):
+        """Writes stored + fresh bars (fresh wins where they overlap) and returns them."""
+        has_stored = stored is not None and not stored.empty
+        if fresh.empty:
+            if has_stored:
+                self._touch(symbol)
+            return stored if has_stored else None
+        if has_stored:
+            fresh = pd.concat([stored[stored['Date'] < fresh['Date'].iloc[0]], fresh], ignore_index=True)
+        self._write(symbol, fresh)
+        return fresh
+
+    def update(self, symbol):
+        """
+        Brings the stored bars for `symbol` up to date and returns them.
+        The last stored bar is downloaded again since it may have been a partial (intraday) bar.
+        """
+        stored = self.read(symbol)
+        end = (datetime.date.today() + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+
+        if stored is not None and not stored.empty:
+            if self.is_fresh(symbol):
+                return stored
+            start = stored['Date'].iloc[-1].strftime('%Y-%m-%d')
+        else:
+            start = HISTORY_START
+        return self._merge(symbol, stored, self.source.fetch(symbol, start, end))
+
+    def update_many(self, symbols):
+        """
+        Bulk version of update(). Symbols with no stored bars share one full-history
+        request, the rest share one request starting at their oldest last bar.
+        """
+        end = (datetime.date.today() + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+        bars, cold, warm = {}, [], {}
+        for symbol in symbols:
+            stored = self.read(symbol)
+            if stored is None or stored.empty:
+                cold.append(symbol)
+            elif self.is_fresh(symbol):
+                bars[symbol] = stored
+            else:
+                warm[symbol] = stored
+
+        if cold:
+            fetched = self.source.fetch_many(cold, HISTORY_START, end)
+            for symbol in cold:
+                bars[symbol] = self._merge(symbol, None, fetched.get(symbol, normalize_ohlcv(None)))
+        if warm:
+            start = min(stored['Date'].iloc[-1] for stored in warm.values()).strftime('%Y-%m-%d')
+            fetched = self.source.fetch_many(list(warm), start, end)
+            for symbol, stored in warm.items():
+                bars[symbol] = self._merge(symbol, stored, fetched.get(symbol, normalize_ohlcv(None)))
+        return bars
+
+    def load(self, ticker):
+        """
+        Resolves `ticker` (trying the .NS listing as a fallback) and returns
+        (symbol, bars). bars is None when no listing has any data.
+        """
+        ticker = ticker.upper().strip()
+        for symbol in self.candidate_symbols(ticker):
+            bars = self.update(symbol)
+            if bars is not None and not bars.empty:
+                self._remember_resolution(ticker, symbol)
+                return symbol, bars
+            print(f"Data empty for {symbol}")
+        return ticker, None
+
+    def load_many(self, tickers):
+        """
+        Bulk version of load(): {ticker: (symbol, bars)}. Each round of candidate
+        listings (plain, then .NS) is fetched with a single update_many call.
+        """
+        pending = {t.upper().strip(): self.candidate_symbols(t.upper().strip()) for t in tickers}
+        loaded = {}
+        while pending:
+            attempt = {ticker: candidates[0] for ticker, candidates in pending.items()}
+            bars = self.update_many(set(attempt.values()))
+            retry = {}
+            for ticker, symbol in attempt.items():
+                found = bars.get(symbol)
+                if found is not None and not found.empty:
+                    self._remember_resolution(ticker, symbol)
+                    loaded[ticker] = (symbol, found)
+                elif len(pending[ticker]) > 1:
+                    retry[ticker] = pending[ticker][1:]
+                else:
+                    loaded[ticker] = (ticker, None)
+            pending = retry
+        return loaded
+
+
+_default_store = None
+
+def get_default_store():
+    global _default_store
+    if _default_store is None:
+        source_dir = os.environ.get("STOCKVISION_DATA_SOURCE_DIR")
+        source = CSVFileSource(source_dir) if source_dir else YFinanceSource()
+        _default_store = OHLCVStore(source=source)
+    return _default_store
+
+def set_default_store(store):
+    """Swaps the store used by model_logic (e.g. one backed by CSVFileSource)."""
+    global _default_store
+    _default_store = store
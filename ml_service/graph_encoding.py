@@ -0,0 +1,137 @@
+import json
+import datetime
+
+# Compact /predict graph_data.
+# The full response is what gets cached; these options are applied per request:
+#   max_points   LTTB downsampling of the validation curve (forecast points are always kept)
+#   date_format  "iso" (YYYY-MM-DD, default), "epoch_days" (days since 1970-01-01),
+#                "delta" (first epoch day, then day differences)
+#   precision    "float64" (default) or "float32" (~7 significant digits)
+# and the body is encoded as msgpack when the Accept header asks for it,
+# JSON otherwise (gzip is negotiated separately through Accept-Encoding).
+
+DATE_FORMATS = ("iso", "epoch_days", "delta")
+PRECISIONS = ("float64", "float32")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+MIN_POINTS = 3
+EPOCH = datetime.date(1970, 1, 1)
+
+
+class GraphOptions:
+    def __init__(self, max_points=None, date_format=None, precision=None):
+        self.max_points = max_points
+        self.date_format = date_format or "iso"
+        self.precision = precision or "float64"
+
+    def validate(self):
+        """Error message for invalid options, or None."""
+        if self.max_points is not None and self.max_points < MIN_POINTS:
+            return f"max_points must be at least {MIN_POINTS}"
+        if self.date_format not in DATE_FORMATS:
+            return f"date_format must be one of {', '.join(DATE_FORMATS)}"
+        if self.precision not in PRECISIONS:
+            return f"precision must be one of {', '.join(PRECISIONS)}"
+        return None
+
+    @property
+    def is_default(self):
+        return self.max_points is None and self.date_format == "iso" and self.precision == "float64"
+
+
+def lttb(y, max_points):
+    """
+    Largest-Triangle-Three-Buckets: indices of `max_points` points of the series
+    y (x = index) that best preserve its visual shape. Keeps the first and last point.
+    """
+    n = len(y)
+    if max_points >= n or max_points < MIN_POINTS:
+        return list(range(n))
+    # Every point except the first and last goes into one of max_points - 2 buckets
+    bucket_size = (n - 2) / (max_points - 2)
+    edges = [1 + int(i * bucket_size) for i in range(max_points - 2)] + [n - 1]
+    selected, prev = [0], 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (just the last point for the final bucket)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = (end + next_end - 1) / 2
+        avg_y = sum(y[end:next_end]) / (next_end - end)
+        # Pick the point forming the largest triangle with the previous pick and that average
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((prev - avg_x) * (y[j] - y[prev]) - (prev - j) * (avg_y - y[prev]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        prev = best
+    selected.append(n - 1)
+    return selected
+
+
+def _round_float32(values):
+    # float32 keeps ~7 significant digits; printing those (not the float32's exact
+    # binary value) is what makes the JSON shorter
+    return [None if v is None else float(f"{v:.7g}") for v in values]
+
+def _encode_dates(dates, date_format):
+    if date_format == "iso":
+        return dates
+    days = [(datetime.date.fromisoformat(d) - EPOCH).days for d in dates]
+    if date_format == "epoch_days":
+        return days
+    return days[:1] + [b - a for a, b in zip(days, days[1:])]
+
+def compact_graph(graph_data, options):
+    """A new graph_data dict with the options applied (graph_data itself is not modified)."""
+    dates, actual, predicted = graph_data["dates"], graph_data["actual"], graph_data["predicted"]
+    # Validation points have an actual price, forecast points (at the end) don't
+    n_validation = sum(1 for v in actual if v is not None)
+
+    indices = list(range(len(dates)))
+    if options.max_points is not None and n_validation > options.max_points:
+        n_forecast = len(dates) - n_validation
+        keep = lttb(actual[:n_validation], max(MIN_POINTS, options.max_points - n_forecast))
+        indices = keep + indices[n_validation:]
+
+    dates = [dates[i] for i in indices]
+    actual = [actual[i] for i in indices]
+    predicted = [predicted[i] for i in indices]
+    if options.precision == "float32":
+        actual, predicted = _round_float32(actual), _round_float32(predicted)
+
+    return {
+        "dates": _encode_dates(dates, options.date_format),
+        "actual": actual,
+        "predicted": predicted,
+        "encoding": {
+            "dates": options.date_format,
+            "precision": options.precision,
+            "points": len(indices),
+            "original_points": len(graph_data["dates"]),
+        },
+    }
+
+
+def wants_msgpack(accept):
+    return any(media_type in (accept or "") for media_type in MSGPACK_TYPES)
+
+def apply(result, options):
+    """A /predict result with its graph_data compacted according to options."""
+    if "graph_data" in result and not options.is_default:
+        result = {**result, "graph_data": compact_graph(result["graph_data"], options)}
+    return result
+
+def render(payload, options, accept=None):
+    """
+    (body bytes, media type) for a response payload (graph_data already applied).
+    msgpack when the Accept header asks for it and msgpack is installed, JSON otherwise.
+    """
+    if wants_msgpack(accept):
+        try:
+            import msgpack
+            return msgpack.packb(payload, use_single_float=options.precision == "float32"), MSGPACK_TYPES[0]
+        except ImportError:
+            pass
+    # Same output as JSONResponse, minus the jsonable_encoder pass and the whitespace
+    body = json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    return body.encode("utf-8"), "application/json"
@@ -0,0 +1,287 @@
+import os
+import copy
+import math
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+# Streaming technical indicators.
+# Every indicator keeps running state (sums, gains/losses, EMAs) and is updated
+# in O(1) per appended bar. FeatureCache keeps one engine per symbol, so a
+# request only pays for the bars that arrived since the previous one.
+#
+# SMA and RSI reproduce pandas' rolling-mean algorithm step for step
+# (Kahan-compensated add/remove, same-value and sign clamps), so the output is
+# identical to Series.rolling(n).mean() based features. EMA/MACD follow the
+# ewm(adjust=False) recurrence.
+
+MAX_CACHED_SYMBOLS = int(os.environ.get("STOCKVISION_FEATURE_CACHE_SYMBOLS", "256"))
+BUFFER_HEADROOM = 64  # spare rows allocated on a full compute, for the bars that follow
+
+
+class RollingMean:
+    """pandas roll_mean for a fixed window, one value at a time."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = None
+
+    def _add(self, val):
+        if self.prev_value is None:
+            self.prev_value = val
+        if val != val:
+            return
+        self.nobs += 1
+        y = val - self.compensation_add
+        t = self.sum_x + y
+        self.compensation_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct += 1
+        if val == self.prev_value:
+            self.num_consecutive_same_value += 1
+        else:
+            self.num_consecutive_same_value = 1
+        self.prev_value = val
+
+    def _remove(self, val):
+        if val != val:
+            return
+        self.nobs -= 1
+        y = -val - self.compensation_remove
+        t = self.sum_x + y
+        self.compensation_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct -= 1
+
+    def update(self, val):
+        """Appends one value, returns the window mean (NaN until the window is full)."""
+        self.values.append(val)
+        if len(self.values) > self.window:
+            self._remove(self.values.popleft())
+        self._add(val)
+
+        if self.nobs < self.window:
+            return math.nan
+        result = self.sum_x / self.nobs
+        if self.num_consecutive_same_value >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+
+# --- Indicators ---
+class Indicator:
+    columns = ()
+
+    def update(self, close):
+        """Consumes the next close, returns one value per column."""
+        raise NotImplementedError
+
+
+class SMA(Indicator):
+    """close.rolling(window).mean().fillna(fill)"""
+
+    def __init__(self, window, name=None, fill=0.0):
+        self.columns = (name or f"MA{window}",)
+        self.fill = fill
+        self.mean = RollingMean(window)
+
+    def update(self, close):
+        value = self.mean.update(close)
+        return (self.fill if value != value else value,)
+
+
+class RSI(Indicator):
+    """Simple-average RSI, same as the original pandas feature (NaN -> fill)."""
+
+    def __init__(self, window=14, name=None, fill=50.0):
+        self.columns = (name or f"RSI{window}",)
+        self.fill = fill
+        self.gains = RollingMean(window)
+        self.losses = RollingMean(window)
+        self.prev_close = None
+
+    def update(self, close):
+        delta = math.nan if self.prev_close is None else close - self.prev_close
+        self.prev_close = close
+        # Same values as delta.clip(lower=0) and -1 * delta.clip(upper=0), signed zeros included
+        up = delta if (delta != delta or delta >= 0) else 0.0
+        down = -1 * (delta if (delta != delta or delta <= 0) else 0.0)
+        avg_gain = self.gains.update(up)
+        avg_loss = self.losses.update(down)
+        if avg_gain != avg_gain or avg_loss != avg_loss:
+            return (self.fill,)
+        if avg_loss == 0:
+            avg_loss = 1e-9
+        rs = avg_gain / avg_loss
+        return (100 - (100 / (1 + rs)),)
+
+
+class EMA(Indicator):
+    """close.ewm(span=span, adjust=False).mean()"""
+
+    def __init__(self, span, name=None):
+        self.columns = (name or f"EMA{span}",)
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = None
+
+    def step(self, x):
+        if self.value is None:
+            self.value = x
+        else:
+            old_wt = 1.0 - self.alpha
+            self.value = ((old_wt * self.value) + (self.alpha * x)) / (old_wt + self.alpha)
+        return self.value
+
+    def update(self, close):
+        return (self.step(close),)
+
+
+class MACD(Indicator):
+    def __init__(self, fast=12, slow=26, signal=9, name="MACD"):
+        self.columns = (name, f"{name}_signal", f"{name}_hist")
+        self.fast, self.slow, self.signal = EMA(fast), EMA(slow), EMA(signal)
+
+    def update(self, close):
+        macd = self.fast.step(close) - self.slow.step(close)
+        signal = self.signal.step(macd)
+        return (macd, signal, macd - signal)
+
+
+class Bollinger(Indicator):
+    """Rolling mean +/- k sample standard deviations (NaN until the window is full)."""
+
+    def __init__(self, window=20, k=2.0, name="BB"):
+        self.columns = (f"{name}_mid", f"{name}_upper", f"{name}_lower")
+        self.window, self.k = window, k
+        self.values = deque(maxlen=window)
+        self.sum_x = 0.0
+        self.sum_xx = 0.0
+
+    def update(self, close):
+        if len(self.values) == self.window:
+            old = self.values[0]
+            self.sum_x -= old
+            self.sum_xx -= old * old
+        self.values.append(close)
+        self.sum_x += close
+        self.sum_xx += close * close
+        if len(self.values) < self.window:
+            return (math.nan, math.nan, math.nan)
+        mean = self.sum_x / self.window
+        var = max(0.0, (self.sum_xx - self.window * mean * mean) / (self.window - 1))
+        band = self.k * math.sqrt(var)
+        return (mean, mean + band, mean - band)
+
+
+def default_indicators():
+    """The indicators used as model features (see model_logic.FEATURE_COLS)."""
+    return [SMA(5, "MA5"), SMA(10, "MA10"), RSI(14, "RSI14")]
+
+
+class IndicatorEngine:
+    def __init__(self, indicators=None):
+        self.indicators = indicators if indicators is not None else default_indicators()
+        self.columns = [c for ind in self.indicators for c in ind.columns]
+
+    def update(self, close):
+        row = []
+        for ind in self.indicators:
+            row.extend(ind.update(close))
+        return row
+
+    def run(self, closes):
+        out = np.empty((len(closes), len(self.columns)))
+        for i, close in enumerate(closes):
+            out[i] = self.update(float(close))
+        return out
+
+
+# --- Per-symbol incremental cache ---
+class _SymbolState:
+    def __init__(self, engine_before_last, engine, buffer, dates, closes):
+        self.engine_before_last = engine_before_last
+        self.engine = engine
+        # Rows past n are spare capacity for the next bars
+        self.buffer = buffer
+        self.n = len(closes)
+        # The last two bars, to recognise the same history on the next call
+        self.tail_dates = dates[-2:].copy()
+        self.tail_closes = closes[-2:].copy()
+
+
+class FeatureCache:
+    def __init__(self, factory=default_indicators, max_symbols=MAX_CACHED_SYMBOLS):
+        self.factory = factory
+        self.max_symbols = max_symbols
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def columns(self):
+        return IndicatorEngine(self.factory()).columns
+
+    def _resume_point(self, state, dates, closes):
+        """
+        Index to resume from, or 0 for a full recompute. The last cached bar is
+        always recomputed since it may have been a partial (intraday) bar.
+        """
+        m = state.n
+        if m < 2 or len(closes) < m:
+            return 0
+        if (dates[m - 2] != state.tail_dates[0] or closes[m - 2] != state.tail_closes[0]
+                or dates[m - 1] != state.tail_dates[1]):
+            return 0  # history changed (e.g. split/dividend adjustment)
+        return m - 1
+
+    def compute(self, symbol, dates, closes):
+        """
+        Indicator values (n_bars, n_columns) for the full series, only new bars are processed.
+        The result is a view of the symbol's buffer, valid until the next call for that symbol.
+        """
+        with self._lock:
+            # Taken out while in use, so a concurrent call for the symbol starts its own buffer
+            state = self._states.pop(symbol, None)
+        start = self._resume_point(state, dates, closes) if state is not None else 0
+        rows = len(closes)
+
+        if start == 0:
+            engine = IndicatorEngine(self.factory())
+            buffer = np.empty((rows + BUFFER_HEADROOM, len(engine.columns)))
+        else:
+            engine = copy.deepcopy(state.engine_before_last)
+            buffer = state.buffer
+            if rows > len(buffer):
+                # Doubling keeps the copies of the history amortised O(1) per new bar
+                grown = np.empty((max(rows, 2 * len(buffer)), buffer.shape[1]))
+                grown[:start] = buffer[:start]
+                buffer = grown
+
+        engine_before_last = None
+        for i in range(start, rows):
+            if i == rows - 1:
+                engine_before_last = copy.deepcopy(engine)
+            buffer[i] = engine.update(float(closes[i]))
+
+        if rows >= 2:
+            with self._lock:
+                self._states[symbol] = _SymbolState(engine_before_last, engine, buffer, dates, closes)
+                self._states.move_to_end(symbol)
+                while len(self._states) > self.max_symbols:
+                    self._states.popitem(last=False)
+        return buffer[:rows]
+
+
+feature_cache = FeatureCache()
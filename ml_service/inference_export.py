@@ -0,0 +1,211 @@
+"""
+CPU inference export: an int8 dynamically quantized (LSTM + Linear), TorchScript
+compiled copy of a trained model, used by the service for inference.
+
+    cd ml_service
+    python inference_export.py AAPL TCS.NS
+    python inference_export.py --all --max-drift 0.005
+
+Each export is checked against the float model on the ticker's validation
+windows; when the forecast prices drift by more than --max-drift (relative),
+or the export isn't faster than the float model (batch 1 and the validation
+set, at the current torch thread count), the export is refused and the
+service keeps using the float model. Exports
+are written next to the weights (<KEY>_model.int8.pt + .json) and are tied to
+the weights they were made from, so retraining a model retires its export.
+"""
+import os
+import io
+import sys
+import copy
+import json
+import time
+import argparse
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+import data_store
+import model_registry
+
+MAX_DRIFT = float(os.environ.get("STOCKVISION_EXPORT_MAX_DRIFT", "0.005"))
+TIMING_REPEATS = 30
+
+
+class ExportRejected(Exception):
+    def __init__(self, report, reason):
+        super().__init__(reason)
+        self.report = report
+
+
+def quantize(model):
+    """int8 dynamic quantization of the LSTM and Linear layers (weights int8, activations quantized on the fly)."""
+    return torch.ao.quantization.quantize_dynamic(copy.deepcopy(model).eval(), {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+
+def compile_model(model, example):
+    """TorchScript version of `model` (scripted, falling back to tracing), frozen for inference."""
+    model.eval()
+    try:
+        compiled = torch.jit.script(model)
+    except Exception:
+        compiled = torch.jit.trace(model, example)
+    try:
+        compiled = torch.jit.freeze(compiled)
+    except Exception:
+        pass  # not every quantized op supports freezing
+    return compiled
+
+def serialized_size(module):
+    buffer = io.BytesIO()
+    if isinstance(module, torch.jit.ScriptModule):
+        torch.jit.save(module, buffer)
+    else:
+        torch.save(module.state_dict(), buffer)
+    return buffer.tell()
+
+def time_forward(model, x, repeats=TIMING_REPEATS):
+    """Median milliseconds per forward pass (after two warm-up calls)."""
+    samples = []
+    with torch.no_grad():
+        for _ in range(2):
+            model(x)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(x)
+            samples.append(time.perf_counter() - start)
+    return float(np.median(samples) * 1000)
+
+def measure_drift(reference, candidate, X, to_price, forecast=None):
+    """
+    Compares the forecasts of two models on windows X, every output column.
+    forecast(model, X) -> (N, days) scaled forecasts (default: the model's outputs).
+    to_price maps scaled predictions to prices; errors are relative to the reference price.
+    """
+    forecast = forecast or (lambda model, windows: model(windows))
+    with torch.no_grad():
+        expected = forecast(reference, X).numpy().ravel()
+        got = forecast(candidate, X).numpy().ravel()
+    expected_price, got_price = to_price(expected), to_price(got)
+    rel = np.abs(got_price - expected_price) / np.maximum(np.abs(expected_price), 1e-9)
+    return {
+        "windows": int(len(X)),
+        "max_abs_scaled": float(np.max(np.abs(got - expected))),
+        "max_rel_error": float(rel.max()),
+        "mean_rel_error": float(rel.mean()),
+    }
+
+
+def is_faster(latency):
+    """True when the export beats the float model at batch 1 and on the validation set."""
+    return (latency["exported_batch1"] < latency["float_batch1"]
+            and latency["exported_validation"] < latency["float_validation"])
+
+def export_key(key, max_drift=MAX_DRIFT, registry=None):
+    """
+    Exports the registered model `key` (SYMBOL or SYMBOL_h<N>). Returns a report
+    with drift, size and latency numbers. Raises ExportRejected over the drift
+    threshold or when the export is slower than the float model.
+    """
+    import model_logic
+    registry = registry or model_logic.registry
+    entry = registry.get(key)
+    if entry is None or entry.meta is None or entry.scaler is None:
+        raise ValueError(f"No trained model with metadata for {key}")
+
+    output_dim = entry.meta.get("output_dim", 1)
+    horizon = output_dim if output_dim > 1 else None
+    symbol = key[:-len(f"_h{horizon}")] if horizon else key
+    _, stock_data, _, error = model_logic.load_features(symbol)
+    if error:
+        raise ValueError(error)
+
+    feature_cols = entry.meta["feature_cols"]
+    close_index = feature_cols.index('Close')
+    data_scaled = entry.scaler.transform(stock_data[feature_cols].values.astype(float))
+    X_tensor, _, split_idx = model_logic.split_windows(data_scaled, close_index, horizon)
+    X_val = (X_tensor[split_idx:] if split_idx < len(X_tensor) else X_tensor).contiguous()
+    if len(X_val) == 0:
+        raise ValueError("Not enough data to validate the export")
+
+    def to_price(scaled):
+        return model_logic.inverse_close(entry.scaler, scaled, close_index, len(feature_cols))
+
+    forecast = None
+    if not horizon:
+        # Default models are rolled forward autoregressively, where quantization error compounds
+        def forecast(model, windows):
+            return model_logic.roll_forecast(model, windows, close_index, model_logic.FORECAST_DAYS)
+
+    float_model = entry.model.eval()
+    exported = compile_model(quantize(float_model), X_val[:1])
+    report = {
+        "key": key,
+        "format": model_registry.EXPORT_FORMAT,
+        "source_version": entry.version,
+        "source_mtime_ns": entry.mtime_ns,
+        "max_drift": max_drift,
+        "drift": measure_drift(float_model, exported, X_val, to_price, forecast),
+        "bytes": {"float": serialized_size(float_model), "exported": serialized_size(exported)},
+        "latency_ms": {
+            "float_batch1": time_forward(float_model, X_val[-1:]),
+            "exported_batch1": time_forward(exported, X_val[-1:]),
+            "float_validation": time_forward(float_model, X_val, repeats=5),
+            "exported_validation": time_forward(exported, X_val, repeats=5),
+        },
+        "torch_threads": torch.get_num_threads(),
+        "created_at": time.time(),
+    }
+    if report["drift"]["max_rel_error"] > max_drift:
+        raise ExportRejected(report, f"max relative drift {report['drift']['max_rel_error']:.4%} > {max_drift:.4%}")
+    if not is_faster(report["latency_ms"]):
+        raise ExportRejected(report, "not faster than the float model")
+
+    data_store.write_atomic(registry.export_path(key), lambda tmp_path: torch.jit.save(exported, tmp_path))
+
+    def write_meta(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(report, f)
+    data_store.write_atomic(registry.export_meta_path(key), write_meta)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("keys", nargs="*", help="model keys (SYMBOL, or SYMBOL_h<N> for direct N-day models)")
+    parser.add_argument("--all", action="store_true", help=f"every model in {model_registry.MODEL_DIR}")
+    parser.add_argument("--max-drift", type=float, default=MAX_DRIFT, help="max relative forecast price drift")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("STOCKVISION_TORCH_THREADS", "1")),
+                        help="torch threads for the latency check (match the service's per-worker count)")
+    args = parser.parse_args()
+    torch.set_num_threads(args.threads)
+
+    keys = [k.upper().strip() for k in args.keys]
+    if args.all:
+        keys += sorted(f[:-len("_model.pth")] for f in os.listdir(model_registry.MODEL_DIR) if f.endswith("_model.pth"))
+    if not keys:
+        parser.error("no models given (pass model keys or --all)")
+
+    failed = 0
+    print(f"{'model':<16} {'status':<9} {'max drift':>10} {'size KB':>15} {'batch-1 ms':>17} {'validation ms':>17}")
+    for key in dict.fromkeys(keys):
+        reason = ""
+        try:
+            report, status = export_key(key, args.max_drift), "exported"
+        except ExportRejected as e:
+            report, status, reason = e.report, "rejected", f"  ({e})"
+        except Exception as e:
+            print(f"{key:<16} {'failed':<9} {e}")
+            failed += 1
+            continue
+        size, latency = report["bytes"], report["latency_ms"]
+        print(f"{key:<16} {status:<9} {report['drift']['max_rel_error']:>10.3%} "
+              f"{size['float'] / 1024:>7.0f}->{size['exported'] / 1024:<7.0f}"
+              f"{latency['float_batch1']:>8.2f}->{latency['exported_batch1']:<8.2f}"
+              f"{latency['float_validation']:>8.1f}->{latency['exported_validation']:<8.1f}{reason}")
+        failed += status == "rejected"
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+# Background job system for training / inference.
+# Work runs in a pool of worker processes (or threads) so a cold-ticker training
+# run never blocks the uvicorn event loop. The queue is bounded: once
+# MAX_PENDING jobs are queued or running, new submissions are rejected.
+
+MAX_WORKERS = int(os.environ.get("STOCKVISION_WORKERS", str(os.cpu_count() or 1)))
+MAX_PENDING = int(os.environ.get("STOCKVISION_MAX_PENDING_JOBS", str(MAX_WORKERS * 4)))
+EXECUTOR_MODE = os.environ.get("STOCKVISION_EXECUTOR", "process")  # "process" or "thread"
+RESULT_TTL = int(os.environ.get("STOCKVISION_JOB_TTL_SECONDS", "3600"))
+
+JOBS_TOTAL = metrics.registry.counter("stockvision_jobs_total", "Finished pool jobs", ("kind", "status"))
+# Training-sized jobs take seconds to minutes, predictions milliseconds, so they get their own buckets
+TRAINING_KINDS = ("retrain", "warmup")
+JOB_SECONDS = metrics.registry.histogram("stockvision_job_seconds", "Job latency from submission to completion", ("kind",))
+TRAINING_JOB_SECONDS = metrics.registry.histogram("stockvision_training_job_seconds",
+                                                  "Retrain / warmup job latency from submission to completion", ("kind",),
+                                                  metrics.TRAINING_BUCKETS)
+JOBS_IN_FLIGHT = metrics.registry.gauge("stockvision_jobs_in_flight", "Queued or running jobs", ("kind",))
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def _init_worker(torch_threads):
+    # Spawned workers don't go through main.py, keep them on CPU as well
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+    import training
+    training.configure_threads(int(os.environ.get("STOCKVISION_TORCH_THREADS", torch_threads)))
+
+def _init_thread_worker():
+    # Thread mode shares the server process's torch thread pools, only explicit env settings apply
+    import training
+    training.configure_threads()
+
+
+class Job:
+    def __init__(self, kind, key):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.future = None
+        self.on_done = None
+        self.spans = []  # [(stage, seconds)] recorded while the job ran
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def current_status(self):
+        if self.status == "queued" and self.future is not None and self.future.running():
+            return "running"
+        return self.status
+
+    def to_dict(self):
+        payload = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "ticker": self.key,
+            "status": self.current_status(),
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "done":
+            payload["result"] = self.result
+        if self.status == "failed":
+            payload["error"] = self.error
+        return payload
+
+
+class JobManager:
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING, mode=EXECUTOR_MODE, result_ttl=RESULT_TTL):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self.mode = mode
+        self.result_ttl = result_ttl
+        self._jobs = {}
+        self._inflight = {}
+        self._kinds = set()  # every kind submitted so far, reported as 0 when idle
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.mode == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, initializer=_init_thread_worker)
+            else:
+                torch_threads = max(1, (os.cpu_count() or 1) // self.max_workers)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(torch_threads,),
+                )
+        return self._executor
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [j.id for j in self._jobs.values() if j.done and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def pending_count(self):
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if not j.done)
+
+    def collect_metrics(self):
+        with self._lock:
+            counts = dict.fromkeys(self._kinds, 0)
+            for job in self._jobs.values():
+                if not job.done:
+                    counts[job.kind] += 1
+        for kind, count in counts.items():
+            JOBS_IN_FLIGHT.set(count, kind)
+
+    def submit(self, fn, *args, kind="predict", key=None, on_done=None):
+        """
+        Queues fn(*args) on the pool and returns the Job. Raises JobQueueFull when saturated.
+        on_done(job) is called once the job has finished.
+        Single-flight: while a job for the same (kind, key) is in flight, that job is
+        returned instead, so concurrent callers share one download / training run.
+        """
+        with self._lock:
+            if key is not None:
+                inflight = self._inflight.get((kind, key))
+                if inflight is not None:
+                    return inflight
+            self._prune()
+            if sum(1 for j in self._jobs.values() if not j.done) >= self.max_pending:
+                raise JobQueueFull(f"Job queue is full ({self.max_pending} pending)")
+            job = Job(kind, key)
+            # Submit under the lock so a coalesced caller never sees a job without a future,
+            # and register the job only once the pool has accepted it.
+            # metrics.collected ships the job's metrics back from the worker with its result.
+            job.future = self._submit_to_executor(metrics.collected, fn, *args)
+            self._jobs[job.id] = job
+            self._kinds.add(kind)
+            if key is not None:
+                self._inflight[(kind, key)] = job
+
+        job.on_done = on_done
+        job.future.add_done_callback(lambda f, job=job: self._finish(job, f))
+        return job
+
+    def _submit_to_executor(self, fn, *args):
+        try:
+            return self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died abruptly (e.g. OOM-killed during training) and took the pool
+            # down with it; its jobs fail through their futures. Start a fresh pool.
+            print("Worker pool is broken, starting a new one")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            return self._get_executor().submit(fn, *args)
+
+    def _finish(self, job, future):
+        # Runs from the future's done callback and from wait(); whichever comes first settles the job
+        with self._lock:
+            if job.done:
+                return
+            if self._inflight.get((job.kind, job.key)) is job:
+                del self._inflight[(job.kind, job.key)]
+            try:
+                result, events, job.spans = future.result()
+                metrics.registry.replay(events)
+                if isinstance(result, dict) and "error" in result:
+                    job.error = result["error"]
+                    job.status = "failed"
+                else:
+                    job.result = result
+                    job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            job.finished_at = time.time()
+        JOBS_TOTAL.inc(job.kind, job.status)
+        histogram = TRAINING_JOB_SECONDS if job.kind in TRAINING_KINDS else JOB_SECONDS
+        histogram.observe(job.finished_at - job.submitted_at, job.kind)
+
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                print(f"Job callback error: {e}")
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def wait(self, job, timeout=None):
+        """Awaits the job without blocking the event loop. Returns the finished Job."""
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), timeout)
+        except asyncio.TimeoutError:
+            raise
+        except Exception:
+            pass  # recorded on the job by _finish
+        # The done callback may not have run yet in the executor's thread
+        self._finish(job, job.future)
+        return job
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+manager = JobManager()
+metrics.registry.register_collector(manager.collect_metrics)
@@ -1,16 +1,33 @@
 import os
+import time
+
+STARTED_AT = time.time()
 
 # FORCE CPU ONLY - CRITICAL FOR RENDER
 # This must be the very first line to prevent "CUDA Error: failed call to cuInit"
 # comment this when running locally with GPU
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel
+from typing import List, Optional
 
 # Import your logic handler
-import model_logic 
+# model_logic, training and batch_inference (torch, pandas, sklearn, yfinance)
+# are imported on first use / by the warmup thread, see warmup.py
+import jobs
+import metrics
+import warmup
+import dashboard_service
+import graph_encoding
+import quote_stream
+import sentiment
+from prediction_cache import cache as prediction_cache
+
+readiness = warmup.Readiness(STARTED_AT)
 
 # Initialize the App
 app = FastAPI()
@@ -31,10 +48,52 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Responses over 1 KB are gzipped for clients sending "Accept-Encoding: gzip"
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# --- Instrumentation ---
+# Every request feeds the /metrics counters and latency histogram. Sending
+# "X-Profile: 1" also returns the request's stage timings (including the ones
+# from its pool job) in a Server-Timing header.
+PROFILE_HEADER = "x-profile"
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    trace = metrics.start_trace() if request.headers.get(PROFILE_HEADER, "0") not in ("", "0", "false") else None
+    metrics.HTTP_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.HTTP_IN_FLIGHT.dec()
+        # Route template, not the raw path, to keep label cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_REQUESTS.inc(request.method, route, str(status))
+        metrics.HTTP_SECONDS.observe(elapsed, request.method, route)
+    if trace is not None:
+        response.headers["Server-Timing"] = metrics.server_timing(trace, elapsed)
+    return response
+
+MAX_HORIZON = 60  # model_logic.MAX_HORIZON, kept here so validation doesn't import the model stack
 
 # --- Input Validation Class ---
 class StockRequest(BaseModel):
     stock_name: str
+    # Optional training budgets for a cold ticker (capped by the server defaults)
+    max_epochs: Optional[int] = None
+    time_budget_seconds: Optional[float] = None
+    # Forecast this many days with the symbol's direct multi-horizon model (default: 3-day rolled forecast)
+    horizon: Optional[int] = None
+    # Optional compact graph_data (see graph_encoding.py); defaults keep the full ISO-date series
+    max_points: Optional[int] = None
+    date_format: Optional[str] = None
+    precision: Optional[str] = None
+
+class BatchStockRequest(BaseModel):
+    stock_names: List[str]
 
 # --- Routes ---
 
@@ -43,34 +102,194 @@ class StockRequest(BaseModel):
 def read_root():
     return {"status": "Server is running", "message": "Welcome to Stock Vision API"}
 
+@app.get("/ready")
+def read_ready():
+    """Readiness probe: 503 until the heavy imports and model warmup are done."""
+    content = {**readiness.to_dict(), "dashboard_snapshot": dashboard_service.service.has_snapshot}
+    return JSONResponse(status_code=200 if readiness.ready else 503, content=content)
+
+@app.get("/metrics")
+def read_metrics():
+    """Prometheus text exposition of the service metrics (see metrics.py)."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+def start_background_services():
+    readiness.mark("app_startup")
+    warmup.start(readiness)
+    dashboard_service.service.start()
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    dashboard_service.service.stop()
+    quote_stream.hub.stop()
+    jobs.manager.shutdown()
+
+def cache_prediction(job):
+    if job.status != "done":
+        return
+    model_logic = warmup.get_module("model_logic")
+    model_info = job.result.get("model", {})
+    symbol, horizon = model_info.get("symbol", job.key), model_info.get("horizon")
+    prediction_cache.put(model_logic.prediction_cache_key(symbol, horizon), job.result)
+
+    # Too many new bars since the model was trained: fine-tune it in the background
+    if model_info.get("stale"):
+        try:
+            jobs.manager.submit(model_logic.retrain_model, symbol, None, horizon,
+                                kind="retrain", key=model_logic.model_key(symbol, horizon))
+        except jobs.JobQueueFull:
+            print(f"Skipping background retrain for {symbol}: job queue is full")
+
 @app.post("/predict")
-async def get_prediction(request: StockRequest):
+async def get_prediction(request: StockRequest, http_request: Request):
     if not request.stock_name:
         raise HTTPException(status_code=400, detail="Stock name is required")
+    if request.horizon is not None and not 1 <= request.horizon <= MAX_HORIZON:
+        raise HTTPException(status_code=400, detail=f"horizon must be between 1 and {MAX_HORIZON}")
+    graph_options = parse_graph_options(request.max_points, request.date_format, request.precision)
 
     print(f"Predicting for: {request.stock_name}")
+    model_logic = await warmup.load_module("model_logic")
+    training = await warmup.load_module("training")
 
-    # Call the function inside your model_logic.py file
-    # This assumes model_logic.py handles the loading and prediction internally
+    # Same ticker, same last bar, same model -> same answer
+    with metrics.span("cache_lookup"):
+        ticker = model_logic.normalize_ticker(request.stock_name)
+        cached = prediction_cache.get(model_logic.prediction_cache_key(ticker, request.horizon))
+    if cached is not None:
+        return render_prediction(cached, graph_options, http_request)
+
+    # Prediction runs in the worker pool so training never blocks the event loop.
+    # When the ticker has no trained model yet, reply 202 with a job id to poll.
+    # Concurrent requests for the same ticker (and horizon) are coalesced onto one job.
     try:
-        result = model_logic.get_stock_prediction(request.stock_name)
-        
-        if "error" in result:
-            raise HTTPException(status_code=500, detail=result["error"])
+        needs_training = not model_logic.has_trained_model(ticker, request.horizon)
+        train_config = training.TrainingConfig.for_request(request.max_epochs, request.time_budget_seconds)
+        job = jobs.manager.submit(model_logic.get_stock_prediction, ticker, train_config, request.horizon,
+                                  key=model_logic.prediction_key(ticker, request.horizon), on_done=cache_prediction)
+    except jobs.JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        # e.g. the worker pool could not be (re)started
+        print(f"Prediction Submit Error: {e}")
+        raise HTTPException(status_code=503, detail=f"Could not queue the prediction: {e}")
 
-        return result
+    if needs_training:
+        return JSONResponse(status_code=202, content=job.to_dict())
+
+    try:
+        job = await jobs.manager.wait(job)
     except Exception as e:
         print(f"Prediction Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    metrics.add_to_trace(job.spans)
+
+    if job.status == "failed":
+        print(f"Prediction Error: {job.error}")
+        raise HTTPException(status_code=500, detail=job.error)
+    return render_prediction(job.result, graph_options, http_request)
+
+def parse_graph_options(max_points, date_format, precision):
+    graph_options = graph_encoding.GraphOptions(max_points, date_format, precision)
+    options_error = graph_options.validate()
+    if options_error:
+        raise HTTPException(status_code=400, detail=options_error)
+    return graph_options
+
+def render_prediction(result, graph_options, http_request):
+    # The cache and jobs keep the full result; downsampling and compact encoding happen per request
+    return encoded_response(graph_encoding.apply(result, graph_options), graph_options, http_request)
+
+def encoded_response(payload, graph_options, http_request):
+    accept = http_request.headers.get("accept", "")
+    if graph_options.is_default and not graph_encoding.wants_msgpack(accept):
+        return payload
+    with metrics.span("encode"):
+        body, media_type = graph_encoding.render(payload, graph_options, accept)
+    return Response(content=body, media_type=media_type)
+
+@app.post("/predict/batch")
+async def get_batch_prediction(request: BatchStockRequest):
+    """
+    Forecasts for many tickers at once (one bulk download, one stacked forward
+    pass per group of compatible models). Errors are reported per ticker.
+    """
+    if not request.stock_names:
+        raise HTTPException(status_code=400, detail="At least one stock name is required")
+    batch_inference = await warmup.load_module("batch_inference")
+    model_logic = await warmup.load_module("model_logic")
+    if len(request.stock_names) > batch_inference.MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400, detail=f"At most {batch_inference.MAX_BATCH_TICKERS} stocks per batch")
+
+    print(f"Batch predicting for: {', '.join(request.stock_names)}")
+    try:
+        job = jobs.manager.submit(batch_inference.predict_batch, request.stock_names, kind="batch")
+        job = await jobs.manager.wait(job)
+    except jobs.JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"Batch Prediction Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    metrics.add_to_trace(job.spans)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+
+    # Tickers without a model get a regular (training) prediction job to poll
+    for item in job.result["results"]:
+        if item.get("error") == "No trained model yet":
+            try:
+                train_job = jobs.manager.submit(model_logic.get_stock_prediction, item["symbol"],
+                                                key=item["symbol"], on_done=cache_prediction)
+                item["job_id"] = train_job.id
+            except jobs.JobQueueFull:
+                pass
+    return job.result
+
+@app.get("/predict/jobs/{job_id}")
+def get_prediction_job(job_id: str, http_request: Request, max_points: Optional[int] = None,
+                       date_format: Optional[str] = None, precision: Optional[str] = None):
+    # Same graph_data options as POST /predict, as query parameters (jobs are shared between callers)
+    graph_options = parse_graph_options(max_points, date_format, precision)
+    job = jobs.manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job id")
+    payload = job.to_dict()
+    if "result" in payload:
+        payload["result"] = graph_encoding.apply(payload["result"], graph_options)
+    return encoded_response(payload, graph_options, http_request)
+
+@app.get("/predict/cache")
+def get_prediction_cache_stats():
+    return prediction_cache.stats()
+
+@app.get("/sentiment/{ticker}")
+async def get_sentiment(ticker: str):
+    """Today's scored headlines for a ticker (cached, see sentiment.py)."""
+    pipeline = sentiment.get_pipeline()
+    try:
+        return await pipeline.run_async(pipeline.analyze(sentiment.query_for(ticker.upper().strip())))
+    except Exception as e:
+        print(f"Sentiment Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/dashboard")
-async def get_dashboard():
+def get_dashboard():
     """
-    Fetches live market overview, trending stocks, and news.
+    Serves the latest market overview, trending stocks, and news snapshot
+    (refreshed in the background by dashboard_service).
     """
     try:
-        data = model_logic.get_dashboard_data()
-        return data
+        return dashboard_service.service.get()
     except Exception as e:
         print(f"Dashboard Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.websocket("/ws/quotes")
+async def stream_quotes(websocket: WebSocket):
+    """
+    Live quotes for the symbols a client subscribes to (see quote_stream.py).
+    One shared upstream poll per symbol and interval, only changed quotes are pushed.
+    """
+    await quote_stream.hub.serve(websocket)
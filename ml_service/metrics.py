@@ -0,0 +1,242 @@
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# In-process metrics with a Prometheus text exposition (GET /metrics).
+# Pool jobs run through collected(): whatever they record is buffered and
+# replayed into the main process registry when the job finishes, so counters
+# from worker processes show up on /metrics just like the in-process ones.
+# Spans also go to the current request's trace when profiling is on
+# (X-Profile header, reported back as a Server-Timing header).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TRAINING_BUCKETS = (1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+# Buffer of (metric name, op, value, label values) while inside collected()
+_events = contextvars.ContextVar("stockvision_metric_events", default=None)
+# [(span name, seconds)] for a profiled request or job
+_trace = contextvars.ContextVar("stockvision_trace", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _record(self, op, value, label_values):
+        if len(label_values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        events = _events.get()
+        if events is not None:
+            events.append((self.name, op, value, tuple(label_values)))
+        else:
+            self.apply(op, value, tuple(label_values))
+
+    def apply(self, op, value, label_values):
+        raise NotImplementedError
+
+    def samples(self):
+        """[(suffix, label values, extra labels, value)]"""
+        with self._lock:
+            return [("", labels, (), value) for labels, value in sorted(self._values.items())]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *label_values, value=1):
+        self._record("inc", value, label_values)
+
+    def set_total(self, value, *label_values):
+        """For collectors mirroring a count kept elsewhere (e.g. PredictionCache.hits)."""
+        self._record("set", value, label_values)
+
+    def apply(self, op, value, label_values):
+        with self._lock:
+            if op == "set":
+                self._values[label_values] = value
+            else:
+                self._values[label_values] = self._values.get(label_values, 0) + value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, *label_values):
+        self._record("set", value, label_values)
+
+    def inc(self, *label_values, value=1):
+        self._record("inc", value, label_values)
+
+    def dec(self, *label_values, value=1):
+        self._record("inc", -value, label_values)
+
+    def apply(self, op, value, label_values):
+        with self._lock:
+            if op == "set":
+                self._values[label_values] = value
+            else:
+                self._values[label_values] = self._values.get(label_values, 0) + value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        self._record("observe", value, label_values)
+
+    def apply(self, op, value, label_values):
+        with self._lock:
+            counts, total = self._values.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[label_values] = (counts, total + value)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    out.append(("_bucket", labels, (("le", _format_value(bound)),), cumulative))
+                out.append(("_sum", labels, (), total))
+                out.append(("_count", labels, (), cumulative))
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                return self._metrics[metric.name]
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def register_collector(self, collect):
+        """collect() is called on every scrape to refresh gauges from live state (e.g. cache stats)."""
+        self._collectors.append(collect)
+
+    def replay(self, events):
+        for name, op, value, label_values in events:
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.apply(op, value, label_values)
+
+    def render(self):
+        for collect in list(self._collectors):
+            try:
+                collect()
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, extra, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(metric.label_names, labels, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# --- Shared metrics ---
+HTTP_REQUESTS = registry.counter("stockvision_http_requests_total", "HTTP requests", ("method", "route", "status"))
+HTTP_SECONDS = registry.histogram("stockvision_http_request_seconds", "HTTP request latency", ("method", "route"))
+HTTP_IN_FLIGHT = registry.gauge("stockvision_http_requests_in_flight", "HTTP requests being served")
+STAGE_SECONDS = registry.histogram("stockvision_stage_seconds", "Prediction pipeline stage duration", ("stage",))
+UPSTREAM_SECONDS = registry.histogram("stockvision_upstream_seconds", "Upstream (market data / news) call duration", ("call",))
+UPSTREAM_ERRORS = registry.counter("stockvision_upstream_errors_total", "Failed upstream calls", ("call",))
+TRAINING_SECONDS = registry.histogram("stockvision_training_seconds", "Model training run duration", ("mode",), TRAINING_BUCKETS)
+TRAINING_EPOCHS = registry.counter("stockvision_training_epochs_total", "Training epochs run", ("mode",))
+MODEL_LOOKUPS = registry.counter("stockvision_model_lookups_total", "Model registry lookups (hit: in memory, load: read from disk, missing: not trained)", ("result",))
+
+
+# --- Spans / profiling ---
+@contextmanager
+def span(name, histogram=STAGE_SECONDS):
+    """Times the block into `histogram` (labelled `name`) and the current trace, if any."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        histogram.observe(seconds, name)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((name, seconds))
+
+def start_trace():
+    """Starts recording spans for the current context (one request). Returns the span list."""
+    trace = []
+    _trace.set(trace)
+    return trace
+
+def add_to_trace(spans):
+    trace = _trace.get()
+    if trace is not None and spans:
+        trace.extend(spans)
+
+def server_timing(trace, total=None):
+    """Server-Timing header value for a trace (durations in ms)."""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in trace]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def collected(fn, *args):
+    """
+    Runs fn(*args) (in a pool worker) buffering its metrics and spans.
+    Returns (result, events, spans); the parent feeds events to registry.replay().
+    """
+    events, trace = [], []
+    events_token, trace_token = _events.set(events), _trace.set(trace)
+    try:
+        result = fn(*args)
+    finally:
+        _events.reset(events_token)
+        _trace.reset(trace_token)
+    return result, events, trace
@@ -1,32 +1,26 @@
 import os
 import time
 import datetime
-import requests
 import numpy as np
 import pandas as pd
-import yfinance as yf
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 # --- PYTORCH IMPORTS (Replaces TensorFlow) ---
 import torch
 import torch.nn as nn
-import torch.optim as optim
 from sklearn.preprocessing import MinMaxScaler
 
-# NLP
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
+import data_store
+import metrics
+import windowing
+import training
+import model_registry
+import indicators
+import sentiment
 
 warnings.filterwarnings("ignore")
 
-# Initialize NLTK
-try:
-    nltk.data.find('sentiment/vader_lexicon.zip')
-except LookupError:
-    nltk.download('vader_lexicon', quiet=True)
-
-sia = SentimentIntensityAnalyzer()
-
 # --- 1. PyTorch LSTM Model Class ---
 class StockLSTM(nn.Module):
     def __init__(self, input_dim, hidden_dim, num_layers, output_dim):
@@ -52,82 +46,57 @@ class StockLSTM(nn.Module):
         return out
 
 # --- Helper Functions ---
-def flatten_columns(df):
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = ['_'.join([str(i) for i in col if i]) for col in df.columns]
-    df.columns = df.columns.str.strip()
-    return df
-
-def canonicalize_ohlcv_names(df):
-    rename_map = {}
-    for col in df.columns:
-        c = str(col).strip().lower()
-        if 'open' in c: rename_map[col] = 'Open'
-        if 'high' in c: rename_map[col] = 'High'
-        if 'low' in c: rename_map[col] = 'Low'
-        if 'close' in c: rename_map[col] = 'Close'
-        if 'volume' in c: rename_map[col] = 'Volume'
-    if rename_map:
-        df = df.rename(columns=rename_map)
-    return df
-
 def fetch_live_news_sentiment(query, head_limit=50):
-    from bs4 import BeautifulSoup # Import here to save memory if not used
+    """Scored headlines for a query as a DataFrame (backed by the cached sentiment pipeline)."""
     try:
-        url = f"https://news.google.com/search?q={requests.utils.requote_uri(query)}&hl=en-US&gl=US&ceid=US:en"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        }
-        r = requests.get(url, headers=headers, timeout=5)
-        soup = BeautifulSoup(r.text, "html.parser")
-        
-        headlines = []
-        selectors = ["article h3", "h3 a", "div[role='heading']"]
-        for selector in selectors:
-            found = soup.select(selector)
-            if found:
-                for h in found[:head_limit]:
-                    txt = h.get_text(strip=True)
-                    if txt and len(txt) > 10:
-                        headlines.append(txt)
-                break
-            
+        pipeline = sentiment.get_pipeline()
+        result = pipeline.run(pipeline.analyze(query))
         today = datetime.date.today()
-        rows = []
-        for t in headlines:
-            score = sia.polarity_scores(t)['compound']
-            rows.append([today, t, score])
-            
+        rows = [[today, h["headline"], h["sentiment"]] for h in result["headlines"][:head_limit]]
         return pd.DataFrame(rows, columns=["date","headline","Sentiment"])
     except Exception as e:
         print(f"Scraper Error: {e}")
         return pd.DataFrame(columns=["date","headline","Sentiment"])
 
 # --- DASHBOARD DATA AGGREGATOR ---
-def get_dashboard_data():
-    # 1. Market Overview
-    indices = { 'S&P 500': '^GSPC', 'DOW': '^DJI', 'NASDAQ': '^IXIC', 'VIX': '^VIX' }
-    overview_data = []
-    history_tickers = "^GSPC ^DJI ^IXIC"
+DASHBOARD_INDICES = { 'S&P 500': '^GSPC', 'DOW': '^DJI', 'NASDAQ': '^IXIC', 'VIX': '^VIX' }
+HISTORY_TICKERS = "^GSPC ^DJI ^IXIC"
+TRENDING_SYMBOLS = [
+    'AAPL', 'NVDA', 'MSFT', 'TSLA', 'AMZN', 
+    'RELIANCE.NS', 'TCS.NS', 'INFY.NS', 'HDFCBANK.NS'
+]
+SECTORS = [
+    { "name": 'Tech', "value": 1.5, "topStock": "NVDA" },
+    { "name": 'Health', "value": -0.5, "topStock": "LLY" },
+    { "name": 'Finance', "value": 0.8, "topStock": "JPM" },
+    { "name": 'Energy', "value": -1.2, "topStock": "XOM" },
+]
+
+def fetch_quote(symbol, session=None):
+    """(last_price, previous_close) for one symbol, or (None, None) on failure."""
+    import yfinance as yf # Only the dashboard needs it, data_store imports its own lazily
+    try:
+        with metrics.span("quote", metrics.UPSTREAM_SECONDS):
+            info = yf.Ticker(symbol, session=session).fast_info
+            return info.last_price, info.previous_close
+    except Exception:
+        metrics.UPSTREAM_ERRORS.inc("quote")
+        return None, None
+
+def fetch_quotes(symbols, session=None, pool=None):
+    """Fetches quotes for all symbols concurrently. Returns {symbol: (price, prev_close)}."""
+    if pool is None:
+        with ThreadPoolExecutor(max_workers=max(1, len(symbols))) as own_pool:
+            return fetch_quotes(symbols, session, own_pool)
+    futures = {sym: pool.submit(fetch_quote, sym, session) for sym in symbols}
+    return {sym: f.result() for sym, f in futures.items()}
+
+def fetch_weekly_performance(session=None):
+    import yfinance as yf
     weekly_perf = []
-    
     try:
-        tickers = yf.Tickers(" ".join(indices.values()))
-        for name, ticker_symbol in indices.items():
-            try:
-                ticker = tickers.tickers[ticker_symbol]
-                info = ticker.fast_info
-                price = info.last_price
-                prev_close = info.previous_close
-                if prev_close:
-                    change = ((price - prev_close) / prev_close) * 100
-                else:
-                    change = 0.0
-                overview_data.append({ "name": name, "value": price, "change": change })
-            except:
-                continue
-            
-        hist_data = yf.download(history_tickers, period="5d", interval="1d", progress=False)['Close']
+        with metrics.span("weekly_history", metrics.UPSTREAM_SECONDS):
+            hist_data = yf.download(HISTORY_TICKERS, period="5d", interval="1d", progress=False, session=session)['Close']
         if not hist_data.empty:
             hist_data = hist_data.reset_index()
             for index, row in hist_data.iterrows():
@@ -140,51 +109,21 @@ def get_dashboard_data():
                         "nasdaq": row.get('^IXIC', 0),
                         "dow": row.get('^DJI', 0)
                     })
-
     except Exception as e:
+        metrics.UPSTREAM_ERRORS.inc("weekly_history")
         print(f"Indices Error: {e}")
-        # Fallback data if API fails
-        overview_data = [
-            {"name": "S&P 500", "value": 5200, "change": 0.5},
-            {"name": "DOW", "value": 39000, "change": 0.2},
-            {"name": "NASDAQ", "value": 16000, "change": 0.8},
-        ]
+    return weekly_perf
 
-    # 2. Trending Stocks
-    trending_symbols = [
-        'AAPL', 'NVDA', 'MSFT', 'TSLA', 'AMZN', 
-        'RELIANCE.NS', 'TCS.NS', 'INFY.NS', 'HDFCBANK.NS'
-    ]
-    trending_data = []
-    try:
-        t_tickers = yf.Tickers(" ".join(trending_symbols))
-        for sym in trending_symbols:
-            try:
-                t = t_tickers.tickers[sym]
-                price = t.fast_info.last_price
-                prev = t.fast_info.previous_close
-                
-                if price is None or prev is None: continue
-
-                change = price - prev
-                pct = (change / prev) * 100
-                
-                display_name = sym.replace('.NS', '')
-                
-                trending_data.append({
-                    "ticker": sym, "name": display_name, "price": price, "change": change, "changePercent": pct
-                })
-            except Exception: continue
-    except Exception: pass
-
-    # 3. News
+def fetch_market_news(session=None):
+    import yfinance as yf
     news_list = []
     try:
-        market_ticker = yf.Ticker("^GSPC")
-        yf_news = market_ticker.news
-        if not yf_news:
-             market_ticker = yf.Ticker("AAPL")
-             yf_news = market_ticker.news
+        with metrics.span("market_news", metrics.UPSTREAM_SECONDS):
+            market_ticker = yf.Ticker("^GSPC", session=session)
+            yf_news = market_ticker.news
+            if not yf_news:
+                 market_ticker = yf.Ticker("AAPL", session=session)
+                 yf_news = market_ticker.news
 
         for item in yf_news[:5]:
             ts = item.get('providerPublishTime', time.time())
@@ -202,188 +141,370 @@ def get_dashboard_data():
                 "url": item.get('link', '#')
             })
     except Exception as e:
-        pass
+        metrics.UPSTREAM_ERRORS.inc("market_news")
 
     if not news_list:
         news_list = [
             {"headline": "Market steady as tech stocks rally", "date": datetime.date.today().strftime("%Y-%m-%d"), "summary": "Positive outlook for the week.", "source": "System", "url": "#"}
         ]
+    return news_list
+
+def get_dashboard_data(session=None, pool=None):
+    """
+    Builds the /dashboard payload. All upstream calls (index and trending quotes,
+    weekly history, news) run concurrently on `pool`, sharing `session`.
+    """
+    if pool is None:
+        with ThreadPoolExecutor(max_workers=len(DASHBOARD_INDICES) + len(TRENDING_SYMBOLS) + 2) as own_pool:
+            return get_dashboard_data(session, own_pool)
+
+    weekly_future = pool.submit(fetch_weekly_performance, session)
+    news_future = pool.submit(fetch_market_news, session)
+    quotes = fetch_quotes(list(DASHBOARD_INDICES.values()) + TRENDING_SYMBOLS, session, pool)
+
+    # 1. Market Overview
+    overview_data = []
+    for name, ticker_symbol in DASHBOARD_INDICES.items():
+        price, prev_close = quotes[ticker_symbol]
+        if price is None:
+            continue
+        if prev_close:
+            change = ((price - prev_close) / prev_close) * 100
+        else:
+            change = 0.0
+        overview_data.append({ "name": name, "value": price, "change": change })
+
+    if not overview_data:
+        # Fallback data if API fails
+        overview_data = [
+            {"name": "S&P 500", "value": 5200, "change": 0.5},
+            {"name": "DOW", "value": 39000, "change": 0.2},
+            {"name": "NASDAQ", "value": 16000, "change": 0.8},
+        ]
+
+    # 2. Trending Stocks
+    trending_data = []
+    for sym in TRENDING_SYMBOLS:
+        price, prev = quotes[sym]
+        if price is None or not prev: continue
 
-    sectors = [
-        { "name": 'Tech', "value": 1.5, "topStock": "NVDA" },
-        { "name": 'Health', "value": -0.5, "topStock": "LLY" },
-        { "name": 'Finance', "value": 0.8, "topStock": "JPM" },
-        { "name": 'Energy', "value": -1.2, "topStock": "XOM" },
-    ]
+        change = price - prev
+        pct = (change / prev) * 100
+        
+        display_name = sym.replace('.NS', '')
+        
+        trending_data.append({
+            "ticker": sym, "name": display_name, "price": price, "change": change, "changePercent": pct
+        })
 
     return {
         "marketOverview": overview_data,
-        "weekly": weekly_perf,
+        "weekly": weekly_future.result(),
         "trending": trending_data,
-        "news": news_list,
-        "sectors": sectors
+        "news": news_future.result(),
+        "sectors": SECTORS
     }
 
 # --- MAIN PREDICTION LOGIC (PyTorch) ---
-def get_stock_prediction(ticker: str):
-    print(f"--- Starting Analysis for {ticker} ---")
+SEQ_LEN = 60
+FEATURE_COLS = ['Open','High','Low','Close','Volume','MA5','MA10','RSI14']
+if sentiment.MODE == "feature":
+    FEATURE_COLS = FEATURE_COLS + ['Sentiment']
+HIDDEN_DIM = 64
+NUM_LAYERS = 1
+# Days rolled forward by the default next-day model
+FORECAST_DAYS = 3
+# Longest direct forecast. One MAX_HORIZON-output head per symbol serves every horizon > 1
+MAX_HORIZON = 60
+
+def build_model(meta=None):
+    """Untrained StockLSTM matching the architecture recorded in a model's metadata."""
+    meta = meta or {}
+    return StockLSTM(
+        input_dim=len(meta.get("feature_cols", FEATURE_COLS)),
+        hidden_dim=meta.get("hidden_dim", HIDDEN_DIM),
+        num_layers=meta.get("num_layers", NUM_LAYERS),
+        output_dim=meta.get("output_dim", 1),
+    )
+
+registry = model_registry.ModelRegistry(build_model)
+
+def model_path_for(symbol):
+    return registry.weights_path(symbol)
+
+def model_horizon(horizon=None):
+    """Output width of the model serving `horizon` days: None for the next-day model, else MAX_HORIZON."""
+    return MAX_HORIZON if horizon and horizon > 1 else None
+
+def model_key(symbol, horizon=None):
+    """Registry key: plain symbol for the default next-day model, SYMBOL_h<MAX_HORIZON> for the direct head."""
+    head = model_horizon(horizon)
+    return symbol if not head else f"{symbol}_h{head}"
+
+def prediction_key(symbol, horizon=None):
+    """Job / cache key of a forecast: the model key plus the requested horizon (which may slice a shared head)."""
+    return model_key(symbol, horizon) if not horizon else f"{model_key(symbol, horizon)}:{horizon}"
+
+def normalize_ticker(ticker: str):
+    """Canonical key for a user-supplied ticker (resolved to its .NS listing when known)."""
     ticker = ticker.upper().strip()
-    
-    # Determine Model Path
-    model_path = os.path.join("saved_models", f"{ticker}_model.pth")
-    
-    # Download Data
-    start_date = "2018-01-01"
-    today = datetime.date.today()
-    tomorrow_date = today + datetime.timedelta(days=1) 
-    end_date = tomorrow_date.strftime('%Y-%m-%d')
-    
+    return data_store.get_default_store().resolved_symbol(ticker) or ticker
+
+def has_trained_model(ticker: str, horizon=None):
+    """Cheap check (no download) used to decide whether a request will need a training run."""
+    key = model_key(normalize_ticker(ticker), horizon)
+    if not registry.exists(key):
+        return False
+    return has_current_features(registry.read_meta(key))
+
+def has_current_features(meta):
+    """
+    False for a model trained on another feature set (STOCKVISION_SENTIMENT switched to
+    or from "feature"); get_stock_prediction retrains those from scratch.
+    """
+    return meta is None or meta.get("feature_cols") == FEATURE_COLS
+
+def warmup(tickers=()):
+    """
+    Loads the given tickers' models into the registry and runs one dummy forward
+    pass, so the first real request doesn't pay for lazy torch initialization.
+    Runs once per pool worker at startup (see warmup.py).
+    """
+    started = time.time()
+    loaded = []
+    models = []
+    for ticker in tickers:
+        symbol = normalize_ticker(ticker)
+        entry = registry.get(symbol)
+        if entry is not None:
+            loaded.append(symbol)
+            models.append((entry.inference, len((entry.meta or {}).get("feature_cols", FEATURE_COLS))))
+    if not models:
+        models.append((build_model().eval(), len(FEATURE_COLS)))
+    with torch.no_grad():
+        for model, input_dim in models:
+            # TorchScript exports optimize on their first calls, so run a couple
+            for _ in range(2):
+                model(torch.zeros(1, SEQ_LEN, input_dim))
+    return {"pid": os.getpid(), "models": loaded, "seconds": time.time() - started}
+
+def prediction_cache_key(ticker: str, horizon=None):
+    """
+    (model key, last bar date, model version) for a ticker, or None when the
+    stored bars are due for a refresh or no model has been trained yet.
+    """
+    symbol = normalize_ticker(ticker)
+    store = data_store.get_default_store()
+    meta = store.meta(symbol)
+    if "last_date" not in meta or not store.is_fresh(symbol):
+        return None
     try:
-        stock_data = yf.download(ticker, start=start_date, end=end_date, progress=False)
-        if stock_data.empty:
-            print(f"Data empty for {ticker}, trying {ticker}.NS...")
-            ticker_ns = f"{ticker}.NS"
-            stock_data = yf.download(ticker_ns, start=start_date, end=end_date, progress=False)
-            if not stock_data.empty:
-                ticker = ticker_ns 
-                model_path = os.path.join("saved_models", f"{ticker}_model.pth")
-        
-        if stock_data.empty: 
-            return {"error": f"No data found for {ticker}. Try adding .NS for Indian stocks."}
-            
-        stock_data.reset_index(inplace=True)
+        model_version = os.stat(model_path_for(model_key(symbol, horizon))).st_mtime_ns
+    except OSError:
+        return None
+    return (prediction_key(symbol, horizon), meta["last_date"], model_version)
+
+def add_features(stock_data, symbol=None):
+    """
+    Adds the MA5 / MA10 / RSI14 feature columns. With a symbol, the per-symbol
+    streaming engine only processes bars it hasn't seen yet.
+    """
+    # Feature Engineering (streaming indicators, same values as the pandas rolling versions)
+    closes = stock_data['Close'].to_numpy(dtype=float)
+    if symbol is not None:
+        values = indicators.feature_cache.compute(symbol, stock_data['Date'].values, closes)
+    else:
+        values = indicators.IndicatorEngine().run(closes)
+    for i, col in enumerate(indicators.feature_cache.columns()):
+        stock_data[col] = values[:, i]
+    if sentiment.MODE == "feature" and symbol is not None:
+        stock_data['Sentiment'] = sentiment.daily_feature(symbol, stock_data['Date'])
+
+    if stock_data[data_store.OHLCV_COLUMNS].isna().values.any():
+        stock_data = stock_data.bfill().ffill()
+    return stock_data
+
+def load_features(ticker: str):
+    """Returns (symbol, stock_data with features, feature_cols, error)."""
+    # Load Data (incremental local store, only new bars are downloaded)
+    try:
+        with metrics.span("download"):
+            symbol, stock_data = data_store.get_default_store().load(ticker)
+        if stock_data is None or stock_data.empty:
+            return symbol, None, None, f"No data found for {symbol}. Try adding .NS for Indian stocks."
     except Exception as e: 
-        return {"error": f"Failed to download stock data: {str(e)}"}
+        return ticker, None, None, f"Failed to download stock data: {str(e)}"
 
-    # Process Data
-    stock_data = flatten_columns(stock_data)
-    stock_data = canonicalize_ohlcv_names(stock_data)
-    if 'Date' not in stock_data.columns and 'date' in stock_data.columns:
-        stock_data.rename(columns={'date':'Date'}, inplace=True)
+    with metrics.span("features"):
+        stock_data = add_features(stock_data, symbol)
+    feature_cols = [c for c in FEATURE_COLS if c in stock_data.columns]
+    return symbol, stock_data, feature_cols, None
+
+def split_windows(data_scaled, close_index, horizon=None):
+    """Windows (float32 strided views, no per-window copies) and an 80/20 train/val split."""
+    X_tensor, y_tensor = windowing.window_tensors(data_scaled, SEQ_LEN, close_index, horizon or 1)
+    split_idx = int(0.8 * len(X_tensor))
+    return X_tensor, y_tensor, split_idx
+
+def train_and_save(symbol, stock_data, feature_cols, scaler, X_tensor, y_tensor, split_idx, train_config=None, init_from=None, horizon=None):
+    """
+    Trains a model (from scratch, or fine-tuned from `init_from` weights) and registers it.
+    With a horizon, the model is the direct multi-horizon variant (output_dim=horizon,
+    see model_horizon).
+    """
+    output_dim = horizon or 1
+    model = build_model({"feature_cols": feature_cols, "output_dim": output_dim})
+    mode = "scratch"
+    if init_from is not None:
+        model.load_state_dict(init_from.model.state_dict())
+        mode = "finetune"
+        train_config = train_config or training.TrainingConfig.for_finetune()
+
+    print(f"Training model for {symbol} ({mode})...")
+    with metrics.span("training"):
+        summary = training.train_model(model, X_tensor[:split_idx], y_tensor[:split_idx],
+                                       X_tensor[split_idx:], y_tensor[split_idx:], train_config)
+    metrics.TRAINING_SECONDS.observe(summary['seconds'], mode)
+    metrics.TRAINING_EPOCHS.inc(mode, value=summary['epochs'])
+    print(f"Trained {symbol}: {summary['epochs']} epochs, {summary['stopped_reason']}, {summary['seconds']:.1f}s")
+
+    return registry.save(model_key(symbol, horizon), model, scaler, {
+        "feature_cols": feature_cols,
+        "seq_len": SEQ_LEN,
+        "hidden_dim": HIDDEN_DIM,
+        "num_layers": NUM_LAYERS,
+        "output_dim": output_dim,
+        "last_bar_date": str(stock_data['Date'].iloc[-1].date()),
+        "bars": len(stock_data),
+        "mode": mode,
+        "training": summary,
+    })
+
+def retrain_model(ticker: str, train_config=None, horizon=None):
+    """
+    Background refresh for a stale model: refits the scaler on the latest bars and
+    fine-tunes the existing weights (trains from scratch when there are none).
+    """
+    horizon = model_horizon(horizon)
+    symbol, stock_data, feature_cols, error = load_features(ticker)
+    if error: return {"error": error}
 
-    # Feature Engineering
-    stock_data['MA5'] = stock_data['Close'].rolling(5).mean().fillna(0)
-    stock_data['MA10'] = stock_data['Close'].rolling(10).mean().fillna(0)
-    
-    # RSI Calculation
-    delta = stock_data['Close'].diff()
-    up = delta.clip(lower=0)
-    down = -1 * delta.clip(upper=0)
-    rs = up.rolling(14).mean() / down.rolling(14).mean().replace(0, 1e-9)
-    stock_data['RSI14'] = (100 - (100 / (1 + rs))).fillna(50)
-    
-    stock_data = stock_data.bfill().ffill()
-    
-    # Select Features
-    feature_cols = ['Open','High','Low','Close','Volume','MA5','MA10','RSI14']
-    feature_cols = [c for c in feature_cols if c in stock_data.columns]
-    
-    # Scaling
     scaler = MinMaxScaler()
     data_scaled = scaler.fit_transform(stock_data[feature_cols].values.astype(float))
+    X_tensor, y_tensor, split_idx = split_windows(data_scaled, feature_cols.index('Close'), horizon)
+    if len(X_tensor) == 0: return {"error": "Not enough data to train."}
+
+    previous = registry.get(model_key(symbol, horizon))
+    if previous is not None and (previous.meta or {}).get("feature_cols", feature_cols) != feature_cols:
+        previous = None
+    entry = train_and_save(symbol, stock_data, feature_cols, scaler, X_tensor, y_tensor, split_idx, train_config,
+                           init_from=previous, horizon=horizon)
+    return {"status": "success", "symbol": symbol, "version": entry.version, "mode": entry.meta["mode"]}
+
+def roll_forecast(predict_fn, windows, close_index, days):
+    """
+    Autoregressive forecast for a batch of windows (N, SEQ_LEN, n_features).
+    Each step predicts the next scaled close for every window, writes it into a
+    copy of the window's last row and shifts the windows by one. Returns (N, days).
+    """
+    steps = []
+    current = windows
+    with torch.no_grad():
+        for _ in range(days):
+            next_scaled = predict_fn(current)[:, 0]
+            steps.append(next_scaled)
+            
+            # Update sequence for next step: copy last row, update close price
+            new_row = current[:, -1, :].clone()
+            new_row[:, close_index] = next_scaled
+            
+            # Shift sequence: Drop first, append new
+            current = torch.cat((current[:, 1:, :], new_row.unsqueeze(1)), dim=1)
+    return torch.stack(steps, dim=1)
+
+def inverse_close(scaler, scaled_close, close_index, n_features):
+    """Inverse-scales a vector of close values in one call."""
+    dummy = np.zeros((len(scaled_close), n_features))
+    dummy[:, close_index] = scaled_close
+    return scaler.inverse_transform(dummy)[:, close_index].astype(float)
+
+def get_stock_prediction(ticker: str, train_config=None, horizon=None):
+    """
+    Validation curve + forecast for a ticker. Without a horizon the default
+    next-day model is rolled forward 3 days (1 day for horizon=1); otherwise the
+    symbol's direct MAX_HORIZON head predicts every day in one forward pass and
+    the first `horizon` days are returned.
+    """
+    head = model_horizon(horizon)
+    print(f"--- Starting Analysis for {ticker} ---")
+    ticker, stock_data, feature_cols, error = load_features(ticker.upper().strip())
+    if error: return {"error": error}
+
+    # Load the registered model together with the scaler it was trained with
+    with metrics.span("model_load"):
+        entry = registry.get(model_key(ticker, horizon))
+    if entry is not None and entry.meta is not None and entry.meta.get("feature_cols") != feature_cols:
+        entry = None
+
+    # Scaling
+    with metrics.span("scaling"):
+        if entry is not None and entry.scaler is not None:
+            scaler = entry.scaler
+            data_scaled = scaler.transform(stock_data[feature_cols].values.astype(float))
+        else:
+            # New model, or legacy weights saved without their scaler
+            scaler = MinMaxScaler()
+            data_scaled = scaler.fit_transform(stock_data[feature_cols].values.astype(float))
     close_index = feature_cols.index('Close')
-    SEQ_LEN = 60
     
     # Prepare Sequences
-    X, y = [], []
-    for i in range(SEQ_LEN, len(data_scaled)):
-        X.append(data_scaled[i-SEQ_LEN:i])
-        y.append(data_scaled[i, close_index])
-    X, y = np.array(X), np.array(y)
+    with metrics.span("windowing"):
+        X_tensor, y_tensor, split_idx = split_windows(data_scaled, close_index, head)
+        # The validation curve shows next-day targets for windows up to the last bar. A direct
+        # head's wide targets stop MAX_HORIZON - 1 bars early, those are for training only.
+        X_next, y_next, val_idx = split_windows(data_scaled, close_index) if head else (X_tensor, y_tensor, split_idx)
 
-    if len(X) == 0: return {"error": "Not enough data to train."}
+    if len(X_tensor) == 0: return {"error": "Not enough data to train."}
 
-    # Convert to PyTorch Tensors
-    # Force CPU for Render compatibility
-    device = torch.device("cpu") 
-    
-    X_tensor = torch.from_numpy(X).float().to(device)
-    y_tensor = torch.from_numpy(y).float().to(device)
-
-    # Train/Val Split
-    split_idx = int(0.8 * len(X))
-    X_train, X_val = X_tensor[:split_idx], X_tensor[split_idx:]
-    y_train, y_val = y_tensor[:split_idx], y_tensor[split_idx:]
+    X_val, y_val = X_next[val_idx:], y_next[val_idx:]
 
-    # Initialize Model
-    model = StockLSTM(input_dim=len(feature_cols), hidden_dim=64, num_layers=1, output_dim=1).to(device)
-    
-    # Check for existing model
-    model_exists = False
-    if os.path.exists(model_path):
-        try:
-            # Map location 'cpu' is crucial here
-            model.load_state_dict(torch.load(model_path, map_location=device))
-            model_exists = True
-        except: pass
-    
-    # Train if no model exists or file is old (simple logic for now: just train if missing)
-    if not model_exists:
-        print(f"Training new model for {ticker}...")
-        criterion = nn.MSELoss()
-        optimizer = optim.Adam(model.parameters(), lr=0.01)
-        
-        model.train()
-        epochs = 50 # Reduced epochs for speed on free tier
-        for epoch in range(epochs):
-            optimizer.zero_grad()
-            outputs = model(X_train)
-            loss = criterion(outputs.squeeze(), y_train)
-            loss.backward()
-            optimizer.step()
-        
-        # Save model
-        os.makedirs(os.path.dirname(model_path), exist_ok=True)
-        torch.save(model.state_dict(), model_path)
+    # Train if no model exists
+    if entry is None:
+        entry = train_and_save(ticker, stock_data, feature_cols, scaler, X_tensor, y_tensor, split_idx, train_config, horizon=head)
+    # int8 TorchScript export when there is one for these weights (see inference_export.py)
+    model = entry.inference
 
-    # Evaluation & Prediction
+    # Evaluation & Prediction (validation curve uses the first forecast step)
     model.eval()
-    with torch.no_grad():
-        y_pred = model(X_val).cpu().numpy()
+    with metrics.span("validation_inference"), torch.no_grad():
+        y_pred = model(X_val.contiguous())[:, 0].cpu().numpy()
         y_val_numpy = y_val.cpu().numpy()
 
     # Inverse Transform logic
-    dummy_pred = np.zeros((len(y_pred), len(feature_cols)))
-    dummy_val = np.zeros((len(y_val_numpy), len(feature_cols)))
-    dummy_pred[:, close_index] = y_pred.flatten()
-    dummy_val[:, close_index] = y_val_numpy.flatten()
-    y_pred_inv = scaler.inverse_transform(dummy_pred)[:, close_index]
-    y_val_inv = scaler.inverse_transform(dummy_val)[:, close_index]
+    y_pred_inv = inverse_close(scaler, y_pred, close_index, len(feature_cols))
+    y_val_inv = inverse_close(scaler, y_val_numpy, close_index, len(feature_cols))
     
-    # Future Predictions (Next 3 Days)
-    future_days = 3
-    future_predictions = []
-    current_seq_tensor = X_tensor[-1].unsqueeze(0) # Last sequence
-    
-    model.eval()
-    for _ in range(future_days):
-        with torch.no_grad():
-            next_step_scaled = model(current_seq_tensor).item()
-        
-        # Inverse scale to get price
-        dummy_future = np.zeros((1, len(feature_cols)))
-        dummy_future[:, close_index] = next_step_scaled
-        next_price = scaler.inverse_transform(dummy_future)[0][close_index]
-        future_predictions.append(float(next_price))
-        
-        # Update sequence for next step
-        new_row_tensor = current_seq_tensor[0, -1, :].clone()
-        new_row_tensor[close_index] = next_step_scaled # Update close price
-        
-        # Shift sequence: Drop first, append new
-        next_seq = torch.cat((current_seq_tensor[0, 1:, :], new_row_tensor.unsqueeze(0)), dim=0)
-        current_seq_tensor = next_seq.unsqueeze(0)
+    # Future Predictions, starting from the window that ends on the last bar
+    with metrics.span("forecasting"):
+        last_window = torch.from_numpy(data_scaled[-SEQ_LEN:].astype(np.float32)).unsqueeze(0)
+        if head:
+            # Direct head: all days in one forward pass
+            with torch.no_grad():
+                future_scaled = model(last_window)[0].numpy()[:horizon]
+        else:
+            # Next 3 Days (or 1), rolled forward one day at a time
+            future_scaled = roll_forecast(model, last_window, close_index, horizon or FORECAST_DAYS)[0].numpy()
+        future_predictions = inverse_close(scaler, future_scaled, close_index, len(feature_cols)).tolist()
 
     # Formatting Output
-    start_val_idx = SEQ_LEN + split_idx
+    start_val_idx = SEQ_LEN + val_idx
     validation_dates = stock_data['Date'].iloc[start_val_idx : start_val_idx + len(y_val)].dt.strftime('%Y-%m-%d').tolist()
     actual_prices = y_val_inv.tolist()
     predicted_prices = y_pred_inv.tolist()
     
-    # Add future dates
+    # Add future dates (after the last real bar)
     if validation_dates:
-        last_real_date = pd.to_datetime(validation_dates[-1])
-        current_date_cursor = last_real_date
+        current_date_cursor = stock_data['Date'].iloc[-1]
         
         for price in future_predictions:
             current_date_cursor += datetime.timedelta(days=1)
@@ -393,11 +514,31 @@ def get_stock_prediction(ticker: str):
             actual_prices.append(None) # No actual data for future
             predicted_prices.append(price)
 
-    trend = "UP" if future_predictions[-1] > future_predictions[-2] else "DOWN"
+    previous_price = future_predictions[-2] if len(future_predictions) > 1 else float(stock_data['Close'].iloc[-1])
+    trend = "UP" if future_predictions[-1] > previous_price else "DOWN"
     
-    return {
+    result = {
         "status": "success",
         "prediction_text": f"AI Analysis for {ticker}. Predicted trend: {trend}",
         "final_predicted_price": future_predictions[-1], 
-        "graph_data": { "dates": validation_dates, "actual": actual_prices, "predicted": predicted_prices }
-    }
\ No newline at end of file
+        "graph_data": { "dates": validation_dates, "actual": actual_prices, "predicted": predicted_prices },
+        "model": {
+            "symbol": ticker,
+            "horizon": horizon,
+            "version": entry.version,
+            "exported": entry.exported,
+            "bars_since_training": entry.bars_since_training(stock_data['Date']),
+            "stale": entry.is_stale(stock_data['Date']),
+        }
+    }
+
+    if sentiment.MODE in ("report", "feature"):
+        try:
+            pipeline = sentiment.get_pipeline()
+            with metrics.span("sentiment"):
+                news = pipeline.run(pipeline.analyze(sentiment.query_for(ticker)))
+            result["sentiment"] = {"date": news["date"], "score": news["score"], "headlines": len(news["headlines"])}
+        except Exception as e:
+            print(f"Sentiment Error: {e}")
+
+    return result
\ No newline at end of file
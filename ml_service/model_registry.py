@@ -0,0 +1,260 @@
+import os
+import io
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from sklearn.preprocessing import MinMaxScaler
+
+import data_store
+import metrics
+
+# Model registry.
+# Each trained model is saved as two files in saved_models/:
+#   <SYMBOL>_model.pth   -> state_dict
+#   <SYMBOL>_model.json  -> version, architecture, feature list, fitted scaler,
+#                           last bar it was trained on, training summary
+# Loaded models stay in memory in an LRU bounded by MAX_BYTES, and are reloaded
+# when the files on disk change (another worker retrained them). The sidecar
+# records a digest of its weights, so a reader caught between the two renames
+# of a save never pairs one version's weights with another's scaler.
+
+MODEL_DIR = os.environ.get("STOCKVISION_MODEL_DIR", "saved_models")
+# Attempts at reading a matching weights + sidecar pair while a save is in progress
+READ_ATTEMPTS = 5
+MAX_BYTES = int(float(os.environ.get("STOCKVISION_MODEL_CACHE_MB", "256")) * 1024 * 1024)
+# Retrain / fine-tune once this many new bars arrived since the model was trained
+RETRAIN_AFTER_BARS = int(os.environ.get("STOCKVISION_RETRAIN_AFTER_BARS", "20"))
+# Serve predictions from the int8 TorchScript export when one matches the weights (see inference_export.py)
+USE_EXPORTS = os.environ.get("STOCKVISION_INFERENCE_EXPORT", "1") != "0"
+# Exports made under older acceptance checks (drift on the first output only, no latency check) are ignored
+EXPORT_FORMAT = 2
+
+
+# --- Scaler persistence ---
+def scaler_to_dict(scaler):
+    return {
+        "data_min": scaler.data_min_.tolist(),
+        "data_max": scaler.data_max_.tolist(),
+        "feature_range": list(scaler.feature_range),
+    }
+
+def scaler_from_dict(payload):
+    """Rebuilds a fitted MinMaxScaler (fitting on the stored min/max rows reproduces it exactly)."""
+    scaler = MinMaxScaler(feature_range=tuple(payload.get("feature_range", (0, 1))))
+    scaler.fit(np.array([payload["data_min"], payload["data_max"]], dtype=float))
+    return scaler
+
+
+class ModelEntry:
+    def __init__(self, symbol, model, meta, mtime_ns):
+        self.symbol = symbol
+        self.model = model
+        self.meta = meta  # None for legacy weights saved without metadata
+        self.mtime_ns = mtime_ns
+        self.scaler = scaler_from_dict(meta["scaler"]) if meta and "scaler" in meta else None
+        self.nbytes = sum(t.numel() * t.element_size() for t in model.state_dict().values())
+        # Module used for inference: the exported model when there is one, else the float model.
+        # Training / fine-tuning and batch stacking always use `model`.
+        self.inference = model
+        self.exported = False
+        self.export_mtime_ns = None
+        self.meta_mtime_ns = None
+
+    @property
+    def version(self):
+        return self.meta.get("version", 0) if self.meta else 0
+
+    def bars_since_training(self, dates):
+        """Number of bars in `dates` newer than the last bar this model was trained on."""
+        if not self.meta or "last_bar_date" not in self.meta:
+            return None
+        return int((dates > np.datetime64(self.meta["last_bar_date"])).sum())
+
+    def is_stale(self, dates, retrain_after=RETRAIN_AFTER_BARS):
+        bars = self.bars_since_training(dates)
+        return bars is None or bars >= retrain_after
+
+
+class ModelRegistry:
+    def __init__(self, model_factory, root=MODEL_DIR, max_bytes=MAX_BYTES):
+        # model_factory(meta) -> an untrained nn.Module with the architecture described by meta
+        self.model_factory = model_factory
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+
+    def weights_path(self, symbol):
+        return os.path.join(self.root, f"{symbol}_model.pth")
+
+    def meta_path(self, symbol):
+        return os.path.join(self.root, f"{symbol}_model.json")
+
+    def read_meta(self, symbol):
+        try:
+            with open(self.meta_path(symbol)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def export_path(self, symbol):
+        return os.path.join(self.root, f"{symbol}_model.int8.pt")
+
+    def export_meta_path(self, symbol):
+        return os.path.join(self.root, f"{symbol}_model.int8.json")
+
+    def _mtime_ns(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _export_mtime_ns(self, symbol):
+        return self._mtime_ns(self.export_meta_path(symbol)) if USE_EXPORTS else None
+
+    def _load_export(self, symbol, mtime_ns):
+        """The exported module for these exact weights, or None."""
+        try:
+            with open(self.export_meta_path(symbol)) as f:
+                export_meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if export_meta.get("source_mtime_ns") != mtime_ns:
+            return None  # made from older weights
+        if export_meta.get("format") != EXPORT_FORMAT:
+            return None
+        try:
+            module = torch.jit.load(self.export_path(symbol), map_location="cpu")
+            module.eval()
+            return module
+        except Exception as e:
+            print(f"Could not load exported model for {symbol}: {e}")
+            return None
+
+    def exists(self, symbol):
+        return os.path.exists(self.weights_path(symbol))
+
+    def get(self, symbol):
+        """Hot model for `symbol` from memory or disk, or None if there is none (or it won't load)."""
+        try:
+            mtime_ns = os.stat(self.weights_path(symbol)).st_mtime_ns
+        except OSError:
+            metrics.MODEL_LOOKUPS.inc("missing")
+            return None
+        meta_mtime_ns = self._mtime_ns(self.meta_path(symbol))
+        export_mtime_ns = self._export_mtime_ns(symbol)
+
+        with self._lock:
+            entry = self._entries.get(symbol)
+            # A changed sidecar (scaler) or an export written after the weights were loaded
+            # also triggers a reload
+            if (entry is not None and entry.mtime_ns == mtime_ns and entry.meta_mtime_ns == meta_mtime_ns
+                    and entry.export_mtime_ns == export_mtime_ns):
+                self._entries.move_to_end(symbol)
+                self.hits += 1
+                metrics.MODEL_LOOKUPS.inc("hit")
+                return entry
+
+        try:
+            meta, meta_mtime_ns, weights, mtime_ns = self._read_files(symbol)
+            model = self.model_factory(meta)
+            # Map location 'cpu' is crucial here
+            model.load_state_dict(torch.load(io.BytesIO(weights), map_location="cpu"))
+            model.eval()
+        except Exception as e:
+            print(f"Could not load model for {symbol}: {e}")
+            return None
+
+        entry = ModelEntry(symbol, model, meta, mtime_ns)
+        entry.meta_mtime_ns = meta_mtime_ns
+        entry.export_mtime_ns = export_mtime_ns
+        exported = self._load_export(symbol, mtime_ns) if USE_EXPORTS else None
+        if exported is not None:
+            entry.inference = exported
+            entry.exported = True
+            entry.nbytes += os.path.getsize(self.export_path(symbol))
+        self._remember(entry)
+        self.loads += 1
+        metrics.MODEL_LOOKUPS.inc("load")
+        return entry
+
+    def _read_files(self, symbol):
+        """(meta, meta mtime, weights bytes, weights mtime) for one consistent save."""
+        for attempt in range(READ_ATTEMPTS):
+            meta, meta_mtime_ns = None, None
+            try:
+                with open(self.meta_path(symbol)) as f:
+                    meta_mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                pass
+            with open(self.weights_path(symbol), "rb") as f:
+                mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+                weights = f.read()
+            # Sidecars written before digests were recorded (or none at all) can't be checked
+            expected = (meta or {}).get("weights_sha256")
+            if expected is None or hashlib.sha256(weights).hexdigest() == expected:
+                return meta, meta_mtime_ns, weights, mtime_ns
+            time.sleep(0.01 * (attempt + 1))  # another worker is between its two renames
+        raise ValueError("weights don't match their metadata")
+
+    def save(self, symbol, model, scaler, meta):
+        """
+        Persists weights + metadata (version bumped from the previous one) and
+        returns the new in-memory entry. Both files are written atomically and the
+        metadata records the weights' digest (see _read_files).
+        """
+        previous = self.read_meta(symbol) or {}
+        meta = dict(meta)
+        meta["version"] = previous.get("version", 0) + 1
+        meta["trained_at"] = time.time()
+        meta["scaler"] = scaler_to_dict(scaler)
+        buffer = io.BytesIO()
+        torch.save(model.state_dict(), buffer)
+        weights = buffer.getvalue()
+        meta["weights_sha256"] = hashlib.sha256(weights).hexdigest()
+
+        os.makedirs(self.root, exist_ok=True)
+
+        def write_meta(tmp_path):
+            with open(tmp_path, "w") as f:
+                json.dump(meta, f)
+        data_store.write_atomic(self.meta_path(symbol), write_meta)
+
+        def write_weights(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(weights)
+        data_store.write_atomic(self.weights_path(symbol), write_weights)
+
+        model.eval()
+        entry = ModelEntry(symbol, model, meta, os.stat(self.weights_path(symbol)).st_mtime_ns)
+        entry.meta_mtime_ns = self._mtime_ns(self.meta_path(symbol))
+        entry.export_mtime_ns = self._export_mtime_ns(symbol)  # a previous export, now stale
+        self._remember(entry)
+        return entry
+
+    def _remember(self, entry):
+        with self._lock:
+            self._entries[entry.symbol] = entry
+            self._entries.move_to_end(entry.symbol)
+            # Evict least recently used models, always keeping the newest one
+            while len(self._entries) > 1 and sum(e.nbytes for e in self._entries.values()) > self.max_bytes:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "models": len(self._entries),
+                "bytes": sum(e.nbytes for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "exported": sum(1 for e in self._entries.values() if e.exported),
+                "hits": self.hits,
+                "loads": self.loads,
+            }
@@ -0,0 +1,88 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import metrics
+
+# Bounded LRU + TTL cache of finished /predict responses.
+# Keys are (symbol, last bar date, model version), so a new bar or a retrained
+# model produces a different key and old entries simply age out of the LRU.
+
+MAX_ENTRIES = int(os.environ.get("STOCKVISION_PREDICTION_CACHE_SIZE", "256"))
+TTL_SECONDS = int(os.environ.get("STOCKVISION_PREDICTION_CACHE_TTL", str(12 * 3600)))
+
+
+class PredictionCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        if key is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if key is None:
+            return
+        with self._lock:
+            # Only one entry per symbol is ever useful, drop the ones for older bars / models
+            for old_key in [k for k in self._entries if k[0] == key[0] and k != key]:
+                del self._entries[old_key]
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+cache = PredictionCache()
+
+LOOKUPS = metrics.registry.counter("stockvision_prediction_cache_lookups_total", "Prediction cache lookups", ("result",))
+EVICTIONS = metrics.registry.counter("stockvision_prediction_cache_evictions_total", "Prediction cache LRU evictions")
+ENTRIES = metrics.registry.gauge("stockvision_prediction_cache_entries", "Cached /predict responses")
+HIT_RATE = metrics.registry.gauge("stockvision_prediction_cache_hit_rate", "Prediction cache hits / lookups")
+
+def collect_metrics():
+    stats = cache.stats()
+    LOOKUPS.set_total(stats["hits"], "hit")
+    LOOKUPS.set_total(stats["misses"], "miss")
+    EVICTIONS.set_total(stats["evictions"])
+    ENTRIES.set(stats["entries"])
+    HIT_RATE.set(stats["hit_rate"])
+
+metrics.registry.register_collector(collect_metrics)
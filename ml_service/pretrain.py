@@ -0,0 +1,225 @@
+"""
+Bulk pre-training: trains (or refreshes) models for a list of tickers ahead of
+time, so the first user asking for a ticker doesn't pay for the training run.
+
+    cd ml_service
+    python pretrain.py --trending
+    python pretrain.py AAPL MSFT TCS.NS --workers 4 --torch-threads 2
+    python pretrain.py --file watchlist.txt --trending --horizon 5
+
+Tickers are trained across a process pool, each worker limited to
+--torch-threads torch threads. Models that are up to date (fewer than
+--retrain-after new bars since they were trained) are skipped; stale ones are
+fine-tuned. Progress is written to a manifest after every ticker, and an
+interrupted run picks up where it stopped when started again with the same
+settings. With --export, each model also gets its int8 TorchScript inference
+export (see inference_export.py). Meant to run nightly (e.g. from cron) before
+market open.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import jobs
+import data_store
+import model_registry
+
+DEFAULT_MANIFEST = os.path.join(model_registry.MODEL_DIR, "pretrain_manifest.json")
+# Finished outcomes; anything else (or a missing record) is retried on resume
+DONE_STATUSES = ("trained", "finetuned", "skipped")
+
+
+def read_tickers(args):
+    tickers = list(args.tickers)
+    for path in args.file or []:
+        with open(path) as f:
+            for line in f:
+                line = line.split("#", 1)[0]
+                tickers.extend(t for t in line.replace(",", " ").split())
+    if args.trending:
+        import model_logic
+        tickers.extend(model_logic.TRENDING_SYMBOLS)
+    return list(dict.fromkeys(t.upper().strip() for t in tickers if t.strip()))
+
+
+def export_one(key):
+    """Exports a model unless its current weights already have an export. Returns manifest fields."""
+    import model_logic
+    import inference_export
+    entry = model_logic.registry.get(key)
+    if entry is not None and entry.exported:
+        return {"export": "current"}
+    try:
+        report = inference_export.export_key(key)
+        return {"export": "exported", "export_drift": report["drift"]["max_rel_error"]}
+    except inference_export.ExportRejected as e:
+        return {"export": "rejected", "export_reason": str(e), "export_drift": e.report["drift"]["max_rel_error"]}
+    except Exception as e:
+        return {"export": "failed", "export_error": str(e)}
+
+def pretrain_one(ticker, horizon, train_config, retrain_after, force, export=False):
+    """Runs in a pool worker. Returns the manifest record for one ticker."""
+    record = train_one(ticker, horizon, train_config, retrain_after, force)
+    if export and record["status"] in DONE_STATUSES:
+        import model_logic
+        record.update(export_one(model_logic.model_key(record["symbol"], horizon)))
+    return record
+
+def train_one(ticker, horizon, train_config, retrain_after, force):
+    import model_logic
+    started = time.time()
+    record = {"ticker": ticker, "symbol": ticker, "horizon": horizon}
+    try:
+        symbol, stock_data, _, error = model_logic.load_features(ticker)
+        record["symbol"] = symbol
+        if error:
+            return {**record, "status": "failed", "error": error, "seconds": time.time() - started}
+
+        entry = model_logic.registry.get(model_logic.model_key(symbol, horizon))
+        if entry is not None:
+            record["bars_since_training"] = entry.bars_since_training(stock_data['Date'])
+            current = model_logic.has_current_features(entry.meta)
+            if not force and current and not entry.is_stale(stock_data['Date'], retrain_after):
+                return {**record, "status": "skipped", "version": entry.version, "seconds": time.time() - started}
+
+        result = model_logic.retrain_model(symbol, train_config, horizon)
+        if "error" in result:
+            return {**record, "status": "failed", "error": result["error"], "seconds": time.time() - started}
+        status = "finetuned" if result["mode"] == "finetune" else "trained"
+        return {**record, "status": status, "version": result["version"], "seconds": time.time() - started}
+    except Exception as e:
+        return {**record, "status": "failed", "error": str(e), "seconds": time.time() - started}
+
+
+class Manifest:
+    """JSON progress file, rewritten atomically after every finished ticker."""
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        self.records = {}
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def resume(self):
+        """Keeps finished records from an interrupted run with the same settings. Returns them."""
+        try:
+            with open(self.path) as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+        if previous.get("finished_at") is None and previous.get("settings") == self.settings:
+            self.records = {t: r for t, r in previous.get("tickers", {}).items() if r.get("status") in DONE_STATUSES}
+            self.started_at = previous.get("started_at", self.started_at)
+        return self.records
+
+    def add(self, record):
+        self.records[record["ticker"]] = record
+        self.save()
+
+    def summary(self):
+        counts = {}
+        for record in self.records.values():
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+        return counts
+
+    def save(self):
+        payload = {
+            "settings": self.settings,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "summary": self.summary(),
+            "tickers": self.records,
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        def writer(tmp_path):
+            with open(tmp_path, "w") as f:
+                json.dump(payload, f, indent=2)
+        data_store.write_atomic(self.path, writer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tickers", nargs="*")
+    parser.add_argument("--file", action="append", help="ticker list (whitespace/comma separated, # comments)")
+    parser.add_argument("--trending", action="store_true", help="include the dashboard's trending symbols")
+    parser.add_argument("--horizon", type=int, help="train the direct multi-horizon models (any N > 1) instead of the default next-day ones")
+    parser.add_argument("--workers", type=int, default=jobs.MAX_WORKERS)
+    parser.add_argument("--torch-threads", type=int, help="torch threads per worker (default: cpu_count / workers)")
+    parser.add_argument("--max-epochs", type=int)
+    parser.add_argument("--time-budget", type=float, help="seconds per training run")
+    parser.add_argument("--retrain-after", type=int, default=model_registry.RETRAIN_AFTER_BARS,
+                        help="new bars after which an existing model is refreshed")
+    parser.add_argument("--force", action="store_true", help="retrain even up-to-date models")
+    parser.add_argument("--export", action="store_true", help="also build int8 TorchScript inference exports")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--no-resume", action="store_true", help="ignore an interrupted run's manifest")
+    args = parser.parse_args()
+
+    tickers = read_tickers(args)
+    if not tickers:
+        parser.error("no tickers given (pass tickers, --file or --trending)")
+    workers = max(1, min(args.workers, len(tickers)))
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // workers)
+    if args.torch_threads:
+        # jobs._init_worker gives the environment variable precedence
+        os.environ["STOCKVISION_TORCH_THREADS"] = str(args.torch_threads)
+
+    # Without overrides, new models get the server's training defaults and stale ones its fine-tune defaults
+    train_config = None
+    if args.max_epochs or args.time_budget:
+        import training
+        train_config = training.TrainingConfig()
+        if args.max_epochs:
+            train_config.max_epochs = args.max_epochs
+        if args.time_budget:
+            train_config.time_budget = args.time_budget
+
+    settings = {"tickers": tickers, "horizon": args.horizon, "retrain_after": args.retrain_after,
+                "force": args.force, "export": args.export, "training": train_config.to_dict() if train_config else None}
+    manifest = Manifest(args.manifest, settings)
+    done = {} if args.no_resume else manifest.resume()
+    pending = [t for t in tickers if t not in done]
+    if done:
+        print(f"Resuming: {len(done)} of {len(tickers)} tickers already done")
+    print(f"Pre-training {len(pending)} tickers on {workers} workers x {torch_threads} torch threads")
+    manifest.save()
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=jobs._init_worker,
+        initargs=(torch_threads,),
+    )
+    try:
+        futures = {executor.submit(pretrain_one, t, args.horizon, train_config, args.retrain_after, args.force, args.export): t
+                   for t in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            manifest.add(record)
+            detail = record.get("error") or f"v{record.get('version')}"
+            if "export" in record:
+                detail += f", export {record['export']}"
+            print(f"[{i}/{len(pending)}] {record['ticker']}: {record['status']} ({detail}, {record['seconds']:.1f}s)")
+    except KeyboardInterrupt:
+        print("Interrupted, progress saved to the manifest. Run again to resume.")
+        executor.shutdown(wait=False, cancel_futures=True)
+        sys.exit(130)
+    executor.shutdown()
+
+    manifest.finished_at = time.time()
+    manifest.save()
+    summary = manifest.summary()
+    print("Done: " + ", ".join(f"{count} {status}" for status, count in sorted(summary.items())))
+    print(f"Manifest: {manifest.path}")
+    if summary.get("failed"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
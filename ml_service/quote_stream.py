@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import warmup
+
+# Live quote streaming (WebSocket /ws/quotes).
+# One shared poller fetches every symbol that at least one client follows,
+# once per POLL_SECONDS, no matter how many clients follow it, and pushes only
+# quotes that changed. Each client has a coalescing outbox (latest quote per
+# symbol), so a slow client just skips intermediate quotes instead of growing
+# a queue; one that can't take a send within SEND_TIMEOUT is disconnected.
+#
+# Protocol (JSON text frames):
+#   client -> {"action": "subscribe" | "unsubscribe", "symbols": ["AAPL", ...]}
+#             (or connect with ?symbols=AAPL,MSFT)
+#   server -> {"type": "quotes", "quotes": [{symbol, price, previousClose, change, changePercent, ts}]}
+#             {"type": "subscribed", "symbols": [...]} / {"type": "error", "detail": ...}
+
+POLL_SECONDS = float(os.environ.get("STOCKVISION_QUOTE_POLL_SECONDS", "5"))
+SEND_TIMEOUT = float(os.environ.get("STOCKVISION_QUOTE_SEND_TIMEOUT", "10"))
+MAX_SYMBOLS_PER_CLIENT = int(os.environ.get("STOCKVISION_QUOTE_MAX_SYMBOLS", "50"))
+MAX_CLIENTS = int(os.environ.get("STOCKVISION_QUOTE_MAX_CLIENTS", "1000"))
+# Application close code sent to clients that fall too far behind
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+CLIENTS = metrics.registry.gauge("stockvision_quote_stream_clients", "Connected quote stream clients")
+SYMBOLS = metrics.registry.gauge("stockvision_quote_stream_symbols", "Symbols followed by at least one client")
+POLLS = metrics.registry.counter("stockvision_quote_stream_polls_total", "Shared upstream quote polls")
+QUOTES_SENT = metrics.registry.counter("stockvision_quote_stream_quotes_sent_total", "Quotes pushed to clients")
+QUOTES_COALESCED = metrics.registry.counter("stockvision_quote_stream_quotes_coalesced_total",
+                                            "Quotes replaced by a newer one before a slow client received them")
+SLOW_DISCONNECTS = metrics.registry.counter("stockvision_quote_stream_slow_disconnects_total",
+                                            "Clients disconnected for not keeping up")
+
+
+def normalize_symbols(symbols):
+    if isinstance(symbols, str):
+        symbols = symbols.split(",")
+    if not isinstance(symbols, list):
+        return []
+    return [s.upper().strip() for s in symbols if isinstance(s, str) and s.strip() and len(s.strip()) <= 20]
+
+def quote_payload(symbol, price, previous_close):
+    change = price - previous_close if previous_close else 0.0
+    return {
+        "symbol": symbol,
+        "price": price,
+        "previousClose": previous_close,
+        "change": change,
+        "changePercent": (change / previous_close) * 100 if previous_close else 0.0,
+        "ts": time.time(),
+    }
+
+
+class Subscriber:
+    """One connected client: the symbols it follows and a coalescing outbox."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.symbols = set()
+        self._quotes = {}    # symbol -> latest quote not sent yet
+        self._control = []  # subscribed / error messages, sent in order
+        self._wakeup = asyncio.Event()
+
+    def offer(self, quote):
+        if quote["symbol"] in self._quotes:
+            QUOTES_COALESCED.inc()
+        self._quotes[quote["symbol"]] = quote
+        self._wakeup.set()
+
+    def notify(self, message):
+        self._control.append(message)
+        self._wakeup.set()
+
+    async def next_messages(self):
+        await self._wakeup.wait()
+        self._wakeup.clear()
+        messages, self._control = self._control, []
+        if self._quotes:
+            messages.append({"type": "quotes", "quotes": list(self._quotes.values())})
+            self._quotes = {}
+        return messages
+
+
+class QuoteHub:
+    def __init__(self, poll_seconds=POLL_SECONDS, fetch=None):
+        self.poll_seconds = poll_seconds
+        self._fetch = fetch  # fetch(symbols) -> {symbol: (price, previous_close)}
+        self._followers = {}  # symbol -> set of Subscribers
+        self._clients = set()
+        self._latest = {}    # symbol -> last published quote
+        self._task = None
+
+    def _get_fetch(self):
+        # Called from a worker thread: the first call imports model_logic and opens the session
+        if self._fetch is None:
+            model_logic = warmup.get_module("model_logic")
+            from dashboard_service import make_session
+            session = make_session()
+            pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="quotes")
+            self._fetch = lambda symbols: model_logic.fetch_quotes(symbols, session, pool)
+        return self._fetch
+
+    def _fetch_quotes(self, symbols):
+        return self._get_fetch()(symbols)
+
+    # Subscriptions (event loop only)
+    def subscribe(self, subscriber, symbols):
+        wanted = [s for s in dict.fromkeys(normalize_symbols(symbols)) if s not in subscriber.symbols]
+        room = max(0, MAX_SYMBOLS_PER_CLIENT - len(subscriber.symbols))
+        new, rejected = wanted[:room], wanted[room:]
+        for symbol in new:
+            subscriber.symbols.add(symbol)
+            self._followers.setdefault(symbol, set()).add(subscriber)
+            # Last known quote right away, the next change arrives with the poller
+            if symbol in self._latest:
+                subscriber.offer(self._latest[symbol])
+        if rejected:
+            subscriber.notify({"type": "error", "detail": f"At most {MAX_SYMBOLS_PER_CLIENT} symbols per connection"})
+        subscriber.notify({"type": "subscribed", "symbols": sorted(subscriber.symbols)})
+        self._ensure_poller()
+
+    def unsubscribe(self, subscriber, symbols=None):
+        for symbol in list(subscriber.symbols) if symbols is None else normalize_symbols(symbols):
+            subscriber.symbols.discard(symbol)
+            followers = self._followers.get(symbol)
+            if followers is not None:
+                followers.discard(subscriber)
+                if not followers:
+                    del self._followers[symbol]
+                    self._latest.pop(symbol, None)
+
+    # Shared poller
+    def _ensure_poller(self):
+        if self._followers and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self._run())
+
+    async def poll_once(self):
+        symbols = sorted(self._followers)
+        if not symbols:
+            return
+        POLLS.inc()
+        quotes = await asyncio.to_thread(self._fetch_quotes, symbols)
+        for symbol, (price, previous_close) in quotes.items():
+            if price is None or symbol not in self._followers:
+                continue
+            last = self._latest.get(symbol)
+            if last is not None and last["price"] == price and last["previousClose"] == previous_close:
+                continue
+            quote = quote_payload(symbol, price, previous_close)
+            self._latest[symbol] = quote
+            for subscriber in self._followers[symbol]:
+                subscriber.offer(quote)
+
+    async def _run(self):
+        # Stops once nobody follows anything; the next subscribe starts it again
+        while self._followers:
+            started = time.monotonic()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"Quote Stream Error: {e}")
+            await asyncio.sleep(max(0.0, self.poll_seconds - (time.monotonic() - started)))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # Connections
+    async def _send_loop(self, subscriber):
+        while True:
+            for message in await subscriber.next_messages():
+                await asyncio.wait_for(subscriber.websocket.send_text(json.dumps(message)), SEND_TIMEOUT)
+                if message["type"] == "quotes":
+                    QUOTES_SENT.inc(value=len(message["quotes"]))
+
+    async def _receive_loop(self, subscriber):
+        while True:
+            text = await subscriber.websocket.receive_text()
+            try:
+                message = json.loads(text)
+                action, symbols = message.get("action"), message.get("symbols", [])
+            except (ValueError, AttributeError):
+                subscriber.notify({"type": "error", "detail": "Expected a JSON object"})
+                continue
+            if action == "subscribe":
+                self.subscribe(subscriber, symbols)
+            elif action == "unsubscribe":
+                self.unsubscribe(subscriber, symbols)
+                subscriber.notify({"type": "subscribed", "symbols": sorted(subscriber.symbols)})
+            else:
+                subscriber.notify({"type": "error", "detail": "action must be 'subscribe' or 'unsubscribe'"})
+
+    async def serve(self, websocket):
+        """Runs one WebSocket connection until the client leaves (or is dropped as too slow)."""
+        await websocket.accept()
+        if len(self._clients) >= MAX_CLIENTS:
+            await websocket.close(code=1013, reason="Too many quote stream clients")
+            return
+
+        subscriber = Subscriber(websocket)
+        self._clients.add(subscriber)
+        initial = websocket.query_params.get("symbols")
+        if initial:
+            self.subscribe(subscriber, initial)
+
+        sender = asyncio.ensure_future(self._send_loop(subscriber))
+        receiver = asyncio.ensure_future(self._receive_loop(subscriber))
+        try:
+            done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if sender in done and isinstance(sender.exception(), asyncio.TimeoutError):
+                SLOW_DISCONNECTS.inc()
+                try:
+                    await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason="Client too slow")
+                except Exception:
+                    pass
+        finally:
+            for task in (sender, receiver):
+                task.cancel()
+            await asyncio.gather(sender, receiver, return_exceptions=True)
+            self.unsubscribe(subscriber)
+            self._clients.discard(subscriber)
+
+    def collect_metrics(self):
+        CLIENTS.set(len(self._clients))
+        SYMBOLS.set(len(self._followers))
+
+
+hub = QuoteHub()
+metrics.registry.register_collector(hub.collect_metrics)
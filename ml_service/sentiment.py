@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+
+# News sentiment pipeline.
+#   fetch   -> one pooled async HTTP client per process, per-query TTL cache
+#   parse   -> BeautifulSoup in a worker thread
+#   score   -> VADER, cached by headline content hash so repeats are never rescored
+#   series  -> per-query daily mean sentiment, persisted under SENTIMENT_DIR
+# Everything runs on a dedicated event loop thread so sync callers (pool
+# workers) and async handlers share the same connection pool.
+
+# off: not used; report: sentiment block in /predict responses; feature: also a model input
+# "feature" adds a 'Sentiment' column to model_logic.FEATURE_COLS, so every existing
+# model is retrained (as a 202 job) on its next request. The feature is 0.0 for days
+# before any headlines were recorded, so run in "report" mode for a while first to
+# build up the daily series under SENTIMENT_DIR.
+MODE = os.environ.get("STOCKVISION_SENTIMENT", "off")
+SENTIMENT_DIR = os.environ.get("STOCKVISION_SENTIMENT_DIR", "sentiment_data")
+QUERY_TTL = int(os.environ.get("STOCKVISION_NEWS_TTL_SECONDS", "900"))
+SCORE_CACHE_SIZE = int(os.environ.get("STOCKVISION_SENTIMENT_CACHE_SIZE", "20000"))
+HEAD_LIMIT = 50
+SELECTORS = ["article h3", "h3 a", "div[role='heading']"]
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+# --- News Sources ---
+class NewsSource:
+    async def fetch_html(self, query):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class GoogleNewsSource(NewsSource):
+    def __init__(self, timeout=5.0, max_connections=20):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": USER_AGENT},
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def fetch_html(self, query):
+        response = await self._get_client().get(
+            "https://news.google.com/search",
+            params={"q": query, "hl": "en-US", "gl": "US", "ceid": "US:en"},
+        )
+        response.raise_for_status()
+        return response.text
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class FileNewsSource(NewsSource):
+    """Serves a local HTML page (e.g. fixtures/news_sample.html) for every query, for tests and offline runs."""
+
+    def __init__(self, path):
+        self.path = path
+
+    async def fetch_html(self, query):
+        return await asyncio.to_thread(self._read)
+
+    def _read(self):
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+
+def parse_headlines(html, head_limit=HEAD_LIMIT):
+    from bs4 import BeautifulSoup # Import here to save memory if not used
+    soup = BeautifulSoup(html, "html.parser")
+    headlines = []
+    for selector in SELECTORS:
+        found = soup.select(selector)
+        if found:
+            for h in found[:head_limit]:
+                txt = h.get_text(strip=True)
+                if txt and len(txt) > 10:
+                    headlines.append(txt)
+            break
+    return headlines
+
+
+# --- Scoring ---
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+def get_analyzer():
+    """VADER analyzer, built (and its lexicon downloaded if missing) on first use."""
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            import nltk
+            from nltk.sentiment import SentimentIntensityAnalyzer
+            try:
+                nltk.data.find('sentiment/vader_lexicon.zip')
+            except LookupError:
+                nltk.download('vader_lexicon', quiet=True)
+            _analyzer = SentimentIntensityAnalyzer()
+        return _analyzer
+
+def headline_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class ScoreCache:
+    """Compound VADER scores keyed by headline hash (bounded LRU)."""
+
+    def __init__(self, max_entries=SCORE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def score_many(self, headlines):
+        keys = [headline_hash(h) for h in headlines]
+        scores, missing = {}, {}
+        with self._lock:
+            for key, text in zip(keys, headlines):
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    scores[key] = self._scores[key]
+                    self.hits += 1
+                elif key not in missing:
+                    missing[key] = text
+                    self.misses += 1
+
+        if missing:
+            analyzer = get_analyzer()
+            fresh = {key: analyzer.polarity_scores(text)['compound'] for key, text in missing.items()}
+            with self._lock:
+                for key, value in fresh.items():
+                    self._scores[key] = value
+                while len(self._scores) > self.max_entries:
+                    self._scores.popitem(last=False)
+            scores.update(fresh)
+        return [(key, scores[key]) for key in keys]
+
+
+# --- Daily series ---
+class DailySentimentStore:
+    """Per-query {date: {sum, count, hashes}}; a headline counts once per day."""
+
+    def __init__(self, root=SENTIMENT_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, query):
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in query)
+        return os.path.join(self.root, f"{safe}.json")
+
+    def load(self, query):
+        try:
+            with open(self._path(query)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def add(self, query, day, scored):
+        import data_store # pulls in numpy/pandas, not needed until something is recorded
+        with self._lock:
+            days = self.load(query)
+            bucket = days.setdefault(day, {"sum": 0.0, "count": 0, "hashes": []})
+            seen = set(bucket["hashes"])
+            for key, score in scored:
+                if key not in seen:
+                    seen.add(key)
+                    bucket["hashes"].append(key)
+                    bucket["sum"] += score
+                    bucket["count"] += 1
+            os.makedirs(self.root, exist_ok=True)
+
+            def writer(tmp_path):
+                with open(tmp_path, "w") as f:
+                    json.dump(days, f)
+            data_store.write_atomic(self._path(query), writer)
+        return days
+
+    def series(self, query):
+        """{date string: mean compound score}"""
+        return {day: b["sum"] / b["count"] for day, b in self.load(query).items() if b["count"]}
+
+
+# --- Pipeline ---
+class SentimentPipeline:
+    def __init__(self, source=None, scores=None, daily=None, ttl=QUERY_TTL):
+        if source is None:
+            fixture = os.environ.get("STOCKVISION_NEWS_FIXTURE")
+            source = FileNewsSource(fixture) if fixture else GoogleNewsSource()
+        self.source = source
+        self.scores = scores or ScoreCache()
+        self.daily = daily or DailySentimentStore()
+        self.ttl = ttl
+        self._headlines = {}  # query -> (fetched_at, headlines)
+        self._inflight = {}   # query -> Task, concurrent fetches of one query share it
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    # Event loop owned by the pipeline
+    def _get_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="sentiment-loop", daemon=True).start()
+            return self._loop
+
+    def submit(self, coro):
+        """Schedules a coroutine on the pipeline loop, returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+
+    def run(self, coro, timeout=30):
+        """Blocking helper for sync callers."""
+        return self.submit(coro).result(timeout)
+
+    async def run_async(self, coro):
+        """Awaitable helper for callers living on another event loop."""
+        return await asyncio.wrap_future(self.submit(coro))
+
+    # Stages (run on the pipeline loop)
+    async def headlines(self, query):
+        cached = self._headlines.get(query)
+        if cached and time.time() - cached[0] < self.ttl:
+            return cached[1]
+        task = self._inflight.get(query)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_headlines(query))
+            self._inflight[query] = task
+            task.add_done_callback(lambda _: self._inflight.pop(query, None))
+        return await task
+
+    async def _fetch_headlines(self, query):
+        try:
+            html = await self.source.fetch_html(query)
+            headlines = await asyncio.to_thread(parse_headlines, html)
+        except Exception as e:
+            print(f"Scraper Error: {e}")
+            return []
+        self._headlines[query] = (time.time(), headlines)
+        return headlines
+
+    async def analyze(self, query):
+        """Today's scored headlines for a query, recorded into the daily series."""
+        headlines = await self.headlines(query)
+        scored = await asyncio.to_thread(self.scores.score_many, headlines)
+        today = datetime.date.today().strftime("%Y-%m-%d")
+        if scored:
+            await asyncio.to_thread(self.daily.add, query, today, scored)
+        return {
+            "query": query,
+            "date": today,
+            "headlines": [{"headline": h, "sentiment": s} for h, (_, s) in zip(headlines, scored)],
+            "score": sum(s for _, s in scored) / len(scored) if scored else None,
+        }
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = SentimentPipeline()
+        return _pipeline
+
+def set_pipeline(pipeline):
+    """Swaps the pipeline (e.g. one built on FileNewsSource)."""
+    global _pipeline
+    with _pipeline_lock:
+        _pipeline = pipeline
+
+
+def query_for(symbol):
+    return f"{symbol.replace('.NS', '')} stock"
+
+def daily_feature(symbol, dates):
+    """
+    Daily sentiment aligned to `dates` (0.0 where nothing was recorded), refreshing
+    today's value first. Used as the optional 'Sentiment' model feature.
+    """
+    import pandas as pd
+    pipeline = get_pipeline()
+    query = query_for(symbol)
+    try:
+        pipeline.run(pipeline.analyze(query))
+    except Exception as e:
+        print(f"Sentiment Error: {e}")
+    series = pipeline.daily.series(query)
+    if not series:
+        return pd.Series(0.0, index=dates.index)
+    return pd.to_datetime(dates).dt.strftime('%Y-%m-%d').map(series).fillna(0.0).astype(float)
@@ -0,0 +1,27 @@
+import pytest
+import torch
+
+import batch_inference
+import model_logic
+
+
+def make_models(n_models, num_layers, input_dim=6, hidden_dim=16, output_dim=1):
+    models = []
+    for seed in range(n_models):
+        torch.manual_seed(seed)
+        models.append(model_logic.StockLSTM(input_dim, hidden_dim, num_layers, output_dim).eval())
+    return models
+
+
+@pytest.mark.parametrize("num_layers", [1, 2])
+@pytest.mark.parametrize("output_dim", [1, 5])
+def test_stacked_forward_matches_stock_lstm(num_layers, output_dim):
+    models = make_models(4, num_layers, output_dim=output_dim)
+    x = torch.rand(len(models), 3, model_logic.SEQ_LEN, 6)
+
+    with torch.no_grad():
+        got = batch_inference.stacked_forward(batch_inference.stack_models(models), x, num_layers)
+        expected = torch.stack([model(x[m]) for m, model in enumerate(models)])
+
+    assert got.shape == (len(models), 3, output_dim)
+    assert torch.allclose(got, expected, atol=1e-6)
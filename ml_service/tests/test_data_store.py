@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+import data_store
+
+
+class RecordingSource(data_store.CSVFileSource):
+    """CSVFileSource that remembers every fetch and how many bars it returned."""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.calls = []
+
+    def fetch(self, symbol, start, end):
+        bars = super().fetch(symbol, start, end)
+        self.calls.append((symbol, start, len(bars)))
+        return bars
+
+
+def write_csv(directory, symbol, rows):
+    dates = pd.bdate_range("2024-01-01", periods=rows)
+    close = 100 + np.arange(rows, dtype=float)
+    frame = pd.DataFrame({"Date": dates, "Open": close, "High": close + 1, "Low": close - 1,
+                          "Close": close, "Volume": 1000.0})
+    frame.to_csv(directory / f"{symbol}.csv", index=False)
+    return frame
+
+
+def make_store(tmp_path, refresh_interval=0):
+    source = RecordingSource(tmp_path / "source")
+    return data_store.OHLCVStore(root=str(tmp_path / "store"), source=source, refresh_interval=refresh_interval), source
+
+
+def test_update_fetches_only_bars_after_the_last_stored_one(tmp_path):
+    (tmp_path / "source").mkdir()
+    write_csv(tmp_path / "source", "AAA", 100)
+    store, source = make_store(tmp_path)
+    first = store.update("AAA")
+    assert len(first) == 100
+    last_stored = first['Date'].iloc[-1]
+
+    full = write_csv(tmp_path / "source", "AAA", 110)
+    bars = store.update("AAA")
+
+    symbol, start, fetched = source.calls[-1]
+    # The last stored bar is fetched again (it may have been partial), plus the 10 new ones
+    assert start == last_stored.strftime('%Y-%m-%d')
+    assert fetched == 11
+    assert len(bars) == 110
+    assert np.array_equal(bars['Close'].to_numpy(), full['Close'].to_numpy())
+    assert np.array_equal(store.read("AAA")['Date'].to_numpy(), full['Date'].to_numpy())
+
+
+def test_ns_resolution_is_remembered(tmp_path):
+    (tmp_path / "source").mkdir()
+    write_csv(tmp_path / "source", "TCS.NS", 50)
+    store, source = make_store(tmp_path)
+
+    symbol, bars = store.load("tcs")
+    assert symbol == "TCS.NS" and len(bars) == 50
+    assert [call[0] for call in source.calls] == ["TCS", "TCS.NS"]
+
+    # A new store over the same directory goes straight to the .NS listing
+    store, source = make_store(tmp_path)
+    assert store.resolved_symbol("TCS") == "TCS.NS"
+    symbol, _ = store.load("TCS")
+    assert symbol == "TCS.NS"
+    assert [call[0] for call in source.calls] == ["TCS.NS"]
+
+
+def test_fresh_symbols_skip_the_upstream_call(tmp_path):
+    (tmp_path / "source").mkdir()
+    write_csv(tmp_path / "source", "AAA", 30)
+    store, source = make_store(tmp_path, refresh_interval=3600)
+    store.update("AAA")
+    assert len(source.calls) == 1
+
+    assert store.is_fresh("AAA")
+    bars = store.update("AAA")
+    assert len(bars) == 30
+    assert len(source.calls) == 1
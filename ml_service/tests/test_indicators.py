@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+
+
+def pandas_features(close):
+    """The feature block get_stock_prediction used before the streaming engine."""
+    df = pd.DataFrame({"Close": close})
+    df['MA5'] = df['Close'].rolling(5).mean().fillna(0)
+    df['MA10'] = df['Close'].rolling(10).mean().fillna(0)
+    delta = df['Close'].diff()
+    up = delta.clip(lower=0)
+    down = -1 * delta.clip(upper=0)
+    rs = up.rolling(14).mean() / down.rolling(14).mean().replace(0, 1e-9)
+    df['RSI14'] = (100 - (100 / (1 + rs))).fillna(50)
+    return df[['MA5', 'MA10', 'RSI14']].to_numpy()
+
+
+def random_walk(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows))), 2)
+
+def with_flat_stretch(close, start, length):
+    close = close.copy()
+    close[start:start + length] = close[start]
+    return close
+
+def day_index(rows):
+    return np.arange(rows).astype("datetime64[D]")
+
+
+SERIES = {
+    "random_walk": random_walk(3000),
+    "flat_stretches": with_flat_stretch(with_flat_stretch(random_walk(1000, seed=1), 100, 30), 600, 15),
+    "all_flat": np.full(200, 123.45),
+    # Only gains: the rolling average loss is 0 and gets replaced by 1e-9
+    "zero_loss": np.round(np.linspace(50, 150, 300), 2),
+    "only_losses": np.round(np.linspace(150, 50, 300), 2),
+    "shorter_than_windows": random_walk(8, seed=2),
+}
+
+
+@pytest.mark.parametrize("name", SERIES)
+def test_engine_matches_pandas_exactly(name):
+    close = SERIES[name]
+    assert np.array_equal(indicators.IndicatorEngine().run(close), pandas_features(close))
+
+
+def test_cache_resumes_after_new_bars():
+    close, dates = SERIES["flat_stretches"], day_index(len(SERIES["flat_stretches"]))
+    cache = indicators.FeatureCache()
+    cache.compute("T", dates[:-5], close[:-5])
+    for end in range(len(close) - 4, len(close) + 1):
+        assert np.array_equal(cache.compute("T", dates[:end], close[:end]), pandas_features(close[:end]))
+
+
+def test_cache_recomputes_changed_last_partial_bar():
+    close, dates = random_walk(500, seed=3), day_index(500)
+    cache = indicators.FeatureCache()
+    cache.compute("T", dates, close)
+
+    # Same bars, but the last one closed at a different price than the intraday snapshot
+    revised = close.copy()
+    revised[-1] += 1.37
+    assert np.array_equal(cache.compute("T", dates, revised), pandas_features(revised))
+
+    # Revised partial bar plus a new one
+    extended = np.append(revised[:-1], [revised[-1] - 0.5, revised[-1] + 2.0])
+    assert np.array_equal(cache.compute("T", day_index(501), extended), pandas_features(extended))
+
+
+def test_cache_recomputes_changed_history():
+    close, dates = random_walk(500, seed=4), day_index(500)
+    cache = indicators.FeatureCache()
+    cache.compute("T", dates, close)
+
+    adjusted = np.round(close * 0.5, 2)  # e.g. a split adjustment
+    assert np.array_equal(cache.compute("T", dates, adjusted), pandas_features(adjusted))
+
+
+def test_cache_grows_its_buffer_one_bar_at_a_time():
+    close, dates = SERIES["random_walk"], day_index(len(SERIES["random_walk"]))
+    cache = indicators.FeatureCache()
+    start = len(close) - 3 * indicators.BUFFER_HEADROOM
+    cache.compute("T", dates[:start], close[:start])
+    for end in range(start + 1, len(close) + 1):
+        values = cache.compute("T", dates[:end], close[:end])
+    assert np.array_equal(values, pandas_features(close))
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+pytest.importorskip("bs4")
+import sentiment
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "news_sample.html")
+
+
+def has_vader():
+    try:
+        import nltk
+        nltk.data.find('sentiment/vader_lexicon.zip')
+        return True
+    except (ImportError, LookupError):
+        return False
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = sentiment.SentimentPipeline(source=sentiment.FileNewsSource(FIXTURE),
+                                           daily=sentiment.DailySentimentStore(str(tmp_path)))
+    yield pipeline
+    if pipeline._loop is not None:
+        pipeline._loop.call_soon_threadsafe(pipeline._loop.stop)
+
+
+def test_fixture_headlines_are_parsed(pipeline):
+    headlines = pipeline.run(pipeline.headlines("AAPL stock"))
+    assert len(headlines) == 6
+    assert "Short" not in headlines
+
+
+@pytest.mark.skipif(not has_vader(), reason="VADER lexicon not installed")
+def test_repeated_analyze_hits_the_score_cache_and_counts_headlines_once(pipeline):
+    first = pipeline.run(pipeline.analyze("AAPL stock"))
+    assert len(first["headlines"]) == 6
+    misses = pipeline.scores.misses
+
+    # Past the query TTL, so the page is fetched and parsed again
+    pipeline.ttl = 0
+    second = pipeline.run(pipeline.analyze("AAPL stock"))
+    assert pipeline.scores.misses == misses
+    assert second["score"] == first["score"]
+
+    days = pipeline.daily.load("AAPL stock")
+    assert days[first["date"]]["count"] == 6
+    assert len(days[first["date"]]["hashes"]) == 6
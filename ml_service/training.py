@@ -0,0 +1,144 @@
+import os
+import copy
+import time
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+# Training engine for StockLSTM.
+# Shuffled mini-batch Adam with validation-based early stopping, bounded by an
+# epoch budget and a wall-clock budget so a cold-start training run has a
+# predictable worst case on CPU-only hosts.
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, str(default)))
+
+def _env_float(name, default):
+    return float(os.environ.get(name, str(default)))
+
+
+class TrainingConfig:
+    def __init__(self, max_epochs=None, batch_size=None, learning_rate=None,
+                 patience=None, min_delta=None, time_budget=None, seed=0):
+        self.max_epochs = max_epochs if max_epochs is not None else _env_int("STOCKVISION_TRAIN_MAX_EPOCHS", 50)
+        self.batch_size = batch_size if batch_size is not None else _env_int("STOCKVISION_TRAIN_BATCH_SIZE", 64)
+        self.learning_rate = learning_rate if learning_rate is not None else _env_float("STOCKVISION_TRAIN_LR", 0.001)
+        # Stop after this many epochs without a val-loss improvement of at least min_delta
+        self.patience = patience if patience is not None else _env_int("STOCKVISION_TRAIN_PATIENCE", 5)
+        self.min_delta = min_delta if min_delta is not None else _env_float("STOCKVISION_TRAIN_MIN_DELTA", 1e-5)
+        # Wall-clock seconds per training run
+        self.time_budget = time_budget if time_budget is not None else _env_float("STOCKVISION_TRAIN_TIME_BUDGET", 60)
+        self.seed = seed
+
+    @classmethod
+    def for_request(cls, max_epochs=None, time_budget=None):
+        """Per-request budgets, never above the server-wide defaults."""
+        config = cls()
+        if max_epochs:
+            config.max_epochs = max(1, min(max_epochs, config.max_epochs))
+        if time_budget:
+            config.time_budget = max(1.0, min(time_budget, config.time_budget))
+        return config
+
+    @classmethod
+    def for_finetune(cls):
+        """Shorter, gentler run for continuing from existing weights."""
+        config = cls()
+        config.max_epochs = min(config.max_epochs, _env_int("STOCKVISION_FINETUNE_MAX_EPOCHS", 10))
+        config.learning_rate = config.learning_rate / 2
+        return config
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+def configure_threads(num_threads=None, interop_threads=None):
+    """
+    Applies torch intra-op / inter-op thread counts (env: STOCKVISION_TORCH_THREADS,
+    STOCKVISION_TORCH_INTEROP_THREADS). Inter-op can only be set once per process,
+    before any parallel work, later attempts are ignored.
+    """
+    num_threads = num_threads or _env_int("STOCKVISION_TORCH_THREADS", 0)
+    interop_threads = interop_threads or _env_int("STOCKVISION_TORCH_INTEROP_THREADS", 0)
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            pass
+
+
+def evaluate(model, X, y, criterion, batch_size):
+    model.eval()
+    total = 0.0
+    with torch.no_grad():
+        for start in range(0, len(X), batch_size):
+            xb, yb = X[start:start + batch_size], y[start:start + batch_size]
+            total += criterion(model(xb).view_as(yb), yb).item() * len(xb)
+    return total / max(1, len(X))
+
+
+def train_model(model, X_train, y_train, X_val=None, y_val=None, config=None):
+    """
+    Trains `model` in place and returns a summary dict. When a validation split
+    is given, the weights from the best validation epoch are restored at the end.
+    """
+    config = config or TrainingConfig()
+    criterion = nn.MSELoss()
+    optimizer = optim.Adam(model.parameters(), lr=config.learning_rate)
+    generator = torch.Generator().manual_seed(config.seed)
+    has_val = X_val is not None and len(X_val) > 0
+
+    started = time.monotonic()
+    deadline = started + config.time_budget
+    best_loss, best_state, best_epoch = float("inf"), None, 0
+    epochs_without_improvement = 0
+    stopped_reason = "max_epochs"
+    epoch = 0
+
+    for epoch in range(1, config.max_epochs + 1):
+        model.train()
+        order = torch.randperm(len(X_train), generator=generator)
+        train_loss = 0.0
+        for start in range(0, len(order), config.batch_size):
+            idx = order[start:start + config.batch_size]
+            # Indexing gathers just this batch out of the strided window view
+            xb, yb = X_train[idx], y_train[idx]
+            optimizer.zero_grad()
+            loss = criterion(model(xb).view_as(yb), yb)
+            loss.backward()
+            optimizer.step()
+            train_loss += loss.item() * len(idx)
+            if time.monotonic() > deadline:
+                break
+        train_loss /= max(1, len(X_train))
+
+        monitored = evaluate(model, X_val, y_val, criterion, config.batch_size * 4) if has_val else train_loss
+        if monitored < best_loss - config.min_delta:
+            best_loss, best_epoch = monitored, epoch
+            best_state = copy.deepcopy(model.state_dict())
+            epochs_without_improvement = 0
+        else:
+            epochs_without_improvement += 1
+
+        if time.monotonic() > deadline:
+            stopped_reason = "time_budget"
+            break
+        if has_val and epochs_without_improvement >= config.patience:
+            stopped_reason = "early_stopping"
+            break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    model.eval()
+
+    return {
+        "epochs": epoch,
+        "best_epoch": best_epoch,
+        "best_loss": best_loss,
+        "monitored": "val_loss" if has_val else "train_loss",
+        "stopped_reason": stopped_reason,
+        "seconds": time.monotonic() - started,
+    }
@@ -0,0 +1,101 @@
+import os
+import time
+import asyncio
+import importlib
+import threading
+
+import jobs
+
+# Startup / warmup.
+# main.py only imports light modules; torch, pandas, sklearn, yfinance and
+# NLTK come in through model_logic on first use. The warmup phase does that
+# import in a background thread, preloads STOCKVISION_WARMUP_TICKERS models in
+# every pool worker and runs a dummy forward pass. /ready reports it.
+
+WARMUP_ENABLED = os.environ.get("STOCKVISION_WARMUP", "1") != "0"
+WARMUP_TICKERS = [t.strip().upper() for t in os.environ.get("STOCKVISION_WARMUP_TICKERS", "").split(",") if t.strip()]
+WARMUP_TIMEOUT = int(os.environ.get("STOCKVISION_WARMUP_TIMEOUT_SECONDS", "300"))
+
+
+# --- Deferred imports ---
+_loaded = {}
+
+def get_module(name):
+    """Imports a (heavy) module on first use. Only fully initialized modules are memoized."""
+    module = _loaded.get(name)
+    if module is None:
+        module = importlib.import_module(name)
+        _loaded[name] = module
+    return module
+
+async def load_module(name):
+    """get_module for async handlers: the first import runs off the event loop."""
+    module = _loaded.get(name)
+    if module is None:
+        module = await asyncio.to_thread(get_module, name)
+    return module
+
+
+class Readiness:
+    def __init__(self, process_started_at):
+        self.process_started_at = process_started_at
+        self.status = "starting"
+        self.timings = {}
+        self.errors = []
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def mark(self, name, since=None):
+        """Records seconds elapsed for a startup phase (from process start by default)."""
+        seconds = time.time() - (since if since is not None else self.process_started_at)
+        with self._lock:
+            self.timings[name] = round(seconds, 3)
+        print(f"Startup: {name} {seconds:.2f}s")
+        return seconds
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "status": self.status,
+                "uptime_seconds": round(time.time() - self.process_started_at, 3),
+                "timings": dict(self.timings),
+                "errors": list(self.errors),
+            }
+
+
+def run(readiness, tickers=WARMUP_TICKERS, manager=jobs.manager):
+    readiness.status = "warming"
+    try:
+        phase = time.time()
+        model_logic = get_module("model_logic")
+        readiness.mark("imports", since=phase)
+
+        phase = time.time()
+        if manager.mode == "thread":
+            # Inference happens in this process
+            get_module("training").configure_threads()
+            model_logic.warmup(tickers)
+        else:
+            # One warmup job per worker: each one imports the stack, loads the models and runs a forward pass.
+            # The first job keeps its worker busy importing torch, so the others spread across the pool.
+            started = [manager.submit(model_logic.warmup, tickers, kind="warmup") for _ in range(manager.max_workers)]
+            for job in started:
+                job.future.result(timeout=WARMUP_TIMEOUT)
+        readiness.mark("models", since=phase)
+        readiness.status = "ready"
+    except Exception as e:
+        print(f"Warmup Error: {e}")
+        readiness.errors.append(str(e))
+        # Serve anyway, whatever didn't warm up is loaded on first use
+        readiness.status = "ready"
+    readiness.mark("ready")
+
+def start(readiness):
+    if not WARMUP_ENABLED:
+        readiness.status = "ready"
+        readiness.mark("ready")
+        return
+    threading.Thread(target=run, args=(readiness,), name="warmup", daemon=True).start()
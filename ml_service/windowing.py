@@ -0,0 +1,32 @@
+import numpy as np
+import torch
+
+# Sliding-window sequence construction for the LSTM.
+# Windows are strided views over a single float32 copy of the scaled data:
+# window i is data[i : i + seq_len] and its target is data[i + seq_len, target_index].
+# Nothing is duplicated per window, so memory stays O(rows * features)
+# regardless of seq_len.
+
+
+def as_float32(data):
+    """One contiguous float32 copy (no copy at all if it already is one)."""
+    return np.ascontiguousarray(data, dtype=np.float32)
+
+def window_tensors(data, seq_len, target_index, horizon=1):
+    """
+    (X, y) tensors sharing memory with one float32 copy of `data`.
+    X is a non-contiguous (n_windows, seq_len, n_features) view.
+    With horizon > 1, y is (n_windows, horizon): the next `horizon` targets after each window.
+    """
+    base = torch.from_numpy(as_float32(data))
+    n_windows = max(0, base.shape[0] - seq_len - horizon + 1)
+    if n_windows == 0:
+        y_shape = (0,) if horizon == 1 else (0, horizon)
+        return base.new_empty((0, seq_len, base.shape[1])), base.new_empty(y_shape)
+    # unfold -> (n_rows - seq_len + 1, n_features, seq_len); keep the windows that have targets
+    X = base.unfold(0, seq_len, 1)[:n_windows].transpose(1, 2)
+    if horizon == 1:
+        y = base[seq_len:, target_index]
+    else:
+        y = base[seq_len:, target_index].unfold(0, horizon, 1)
+    return X, y
@@ -4,4 +4,70 @@
 export const API_BASE_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
 
 // NOTE: If you used Create-React-App instead of Vite, use:
-// export const API_BASE_URL = process.env.REACT_APP_API_URL || "http://localhost:8000";
\ No newline at end of file
+// export const API_BASE_URL = process.env.REACT_APP_API_URL || "http://localhost:8000";
+const JOB_POLL_INTERVAL_MS = 2000;
+// The charts can't show more points than this; the server downsamples the validation curve
+const CHART_MAX_POINTS = 300;
+
+// POST /predict answers 202 with a job id when the ticker still has to be trained.
+// This polls the job until it finishes and resolves with the prediction payload.
+export async function requestPrediction(stockName: string): Promise<any> {
+  const response = await fetch(`${API_BASE_URL}/predict`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ stock_name: stockName.toUpperCase(), max_points: CHART_MAX_POINTS }),
+  });
+  let data = await response.json();
+  if (!response.ok || data.error) {
+    throw new Error(data.error || data.detail || "Failed to get prediction");
+  }
+
+  while (data.job_id) {
+    if (data.status === "done") return data.result;
+    if (data.status === "failed") throw new Error(data.error || "Failed to get prediction");
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    const poll = await fetch(`${API_BASE_URL}/predict/jobs/${data.job_id}?max_points=${CHART_MAX_POINTS}`);
+    data = await poll.json();
+    if (!poll.ok) throw new Error(data.detail || "Failed to get prediction");
+  }
+  return data;
+}
+
+export interface LiveQuote {
+  symbol: string;
+  price: number;
+  previousClose: number | null;
+  change: number;
+  changePercent: number;
+  ts: number;
+}
+
+const QUOTE_RECONNECT_MS = 5000;
+
+// Live quotes over the /ws/quotes WebSocket. Only changed quotes are pushed.
+// Reconnects (and resubscribes) after a dropped connection; call the returned
+// function to stop.
+export function subscribeQuotes(symbols: string[], onQuotes: (quotes: LiveQuote[]) => void): () => void {
+  const wsUrl = API_BASE_URL.replace(/^http/, "ws") + "/ws/quotes";
+  let socket: WebSocket | null = null;
+  let stopped = false;
+  let retry: ReturnType<typeof setTimeout> | undefined;
+
+  const connect = () => {
+    socket = new WebSocket(`${wsUrl}?symbols=${encodeURIComponent(symbols.join(","))}`);
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === "quotes") onQuotes(message.quotes);
+    };
+    socket.onclose = () => {
+      if (!stopped) retry = setTimeout(connect, QUOTE_RECONNECT_MS);
+    };
+  };
+  connect();
+
+  return () => {
+    stopped = true;
+    clearTimeout(retry);
+    socket?.close();
+  };
+}
@@ -29,7 +29,7 @@ import {
   ExternalLink,
 } from "lucide-react";
 
-import { API_BASE_URL } from "../api";
+import { API_BASE_URL, requestPrediction, subscribeQuotes } from "../api";
 
 // --- 1. INLINE UI COMPONENTS ---
 const Card = ({
@@ -280,16 +280,7 @@ const Visions: React.FC = () => {
     setError(null);
     setResult(null);
     try {
-      const response = await fetch(`${API_BASE_URL}/predict`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ stock_name: stockName.toUpperCase() }),
-      });
-      const data = await response.json();
-      if (!response.ok || data.error)
-        throw new Error(
-          data.error || data.detail || "Failed to get prediction"
-        );
+      const data = await requestPrediction(stockName);
       setResult(data);
       if (data.graph_data) {
         const formattedData = data.graph_data.dates.map(
@@ -637,6 +628,27 @@ const Dashboard: React.FC = () => {
     fetchDashboardData();
   }, []);
 
+  // Keep trending prices live once the snapshot has loaded
+  const trendingKey = (data?.trending || []).map((s) => s.ticker).join(",");
+  useEffect(() => {
+    if (!trendingKey || error) return;
+    return subscribeQuotes(trendingKey.split(","), (quotes) => {
+      setData((prev) => {
+        if (!prev) return prev;
+        const bySymbol = new Map(quotes.map((q) => [q.symbol, q]));
+        return {
+          ...prev,
+          trending: prev.trending.map((stock) => {
+            const quote = bySymbol.get(stock.ticker);
+            return quote
+              ? { ...stock, price: quote.price, change: quote.change, changePercent: quote.changePercent }
+              : stock;
+          }),
+        };
+      });
+    });
+  }, [trendingKey, error]);
+
   const handleStockClick = (ticker: string) =>
     navigate(`/analysis?symbol=${ticker}`);
   const marketOverview = data?.marketOverview || [];
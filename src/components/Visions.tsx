@@ -1,5 +1,5 @@
 import React, { useState } from "react";
-import { API_BASE_URL } from "../api"; // Import at the top
+import { requestPrediction } from "../api"; // Import at the top
 
 import {
   LineChart,
@@ -53,20 +53,7 @@ const Visions: React.FC = () => {
 
     try {
       // ... inside handlePrediction ...
-      const response = await fetch(`${API_BASE_URL}/predict`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ stock_name: stockName.toUpperCase() }),
-      });
-
-      const data = await response.json();
-
-      if (!response.ok || data.error) {
-        throw new Error(
-          data.error || data.detail || "Failed to get prediction"
-        );
-      }
-
+      const data = await requestPrediction(stockName);
       setResult(data);
 
       // Format data for Recharts